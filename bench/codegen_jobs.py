@@ -0,0 +1,61 @@
+import argparse
+import gc
+import os
+import sys
+import time
+
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ray'))
+
+from cpp.transformer import RayToCpp
+from generator import RayProgramGenerator
+from parser_cache import ParserCache, PARSER_OPTIONS
+from phase.lowering import RayLowering
+
+
+def timeCodegen(program, jobs, repeat):
+    # NOTE: includes starting the pool, it is paid on every build.
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        out = StringIO()
+        start = time.perf_counter()
+        RayToCpp(".").processTree(program, out, jobs=jobs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out.getvalue()
+
+
+def main(args):
+    cache = ParserCache(enabled=False)
+    parser = cache.loadParser("grammer/ray.ebnf", transformer=RayLowering(),
+                              **PARSER_OPTIONS["lalr"])
+    source = RayProgramGenerator().generateLines(args.lines)
+    program = parser.parse(source)
+    print("%d lines, %d top level statements, %d cpus" % (
+        source.count("\n"), len(program.statements), os.cpu_count()))
+    print("%6s %12s %12s %10s %10s" % ("jobs", "seconds", "MB/sec",
+                                       "speedup", "identical"))
+    serial = None
+    for jobs in args.jobs or range(1, os.cpu_count() + 1):
+        elapsed, cpp = timeCodegen(program, jobs, args.repeat)
+        if serial is None:
+            serial = elapsed, cpp
+        print("%6d %12.4f %12.2f %10.2f %10s" % (
+            jobs, elapsed, len(cpp) / elapsed / (1024.0 * 1024.0),
+            serial[0] / elapsed, cpp == serial[1]))
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Ray parallel codegen scaling,'
+                                  ' --jobs 1..N over one generated program')
+    cmd.add_argument('--lines', dest='lines', default=64000, type=int,
+                     help='approximate program size in lines')
+    cmd.add_argument('--jobs', dest='jobs', nargs='+', type=int, default=None,
+                     help='job counts to run, 1 to the cpu count by default,'
+                          ' the first one is the baseline')
+    cmd.add_argument('--repeat', dest='repeat', default=3,
+                     help='runs per measurement', type=int)
+    sys.exit(main(cmd.parse_args()))
@@ -0,0 +1,103 @@
+import argparse
+import gc
+import os
+import sys
+import time
+
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ray'))
+
+from compact_ir import CompactTree
+from cpp.transformer import RayToCpp
+from generator import RayProgramGenerator
+from parser_cache import ParserCache, PARSER_OPTIONS
+from phase.lowering import RayLowering
+from ray_ast import iterNodes
+from visitor import Visitor
+
+
+class LegacyDispatch(object):
+    # NOTE: the lookup the visitors used before visitor.Visitor, a dict of
+    # bound methods per instance with a partial built as the get default.
+
+    def __init__(self):
+        self.nodeDecoders = {kind: self.handle for kind in RayToCpp.handlers}
+
+    def handle(self, node):
+        return node
+
+    def fallback(self, node):
+        return node
+
+    def getDecoder(self, node, default=fallback):
+        return self.nodeDecoders.get(node.kind, partial(default, self))
+
+    def run(self, nodes):
+        for node in nodes:
+            self.getDecoder(node)(node)
+
+
+class CompiledDispatch(Visitor):
+    handlers = {kind: "handle" for kind in RayToCpp.handlers}
+    default_handler = "fallback"
+
+    def handle(self, node):
+        return node
+
+    def fallback(self, node):
+        return node
+
+    def run(self, nodes):
+        for node in nodes:
+            self.dispatch(node)
+
+
+class EmptyLoop(object):
+
+    def run(self, nodes):
+        for node in nodes:
+            pass
+
+
+def timeRun(runner, nodes, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        runner.run(nodes)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(args):
+    cache = ParserCache(enabled=False)
+    parser = cache.loadParser("grammer/ray.ebnf", transformer=RayLowering(),
+                              **PARSER_OPTIONS["lalr"])
+    program = parser.parse(RayProgramGenerator().generateLines(args.lines))
+    trees = {
+        "ast": program,
+        "compact": CompactTree().packProgram(program),
+    }
+    runners = [("empty", EmptyLoop()), ("legacy", LegacyDispatch()),
+               ("compiled", CompiledDispatch())]
+    print("%8s %10s %10s %12s" % ("tree", "dispatch", "nodes", "ns/node"))
+    for tree_name, tree in trees.items():
+        nodes = list(iterNodes(tree))
+        for name, runner in runners:
+            elapsed = timeRun(runner, nodes, args.repeat)
+            print("%8s %10s %10d %12.1f" % (tree_name, name, len(nodes),
+                                            elapsed * 1e9 / len(nodes)))
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Ray visitor dispatch'
+                                  ' micro-benchmark, cost per node of'
+                                  ' finding and calling a handler')
+    cmd.add_argument('--lines', dest='lines', default=16000, type=int,
+                     help='approximate program size in lines')
+    cmd.add_argument('--repeat', dest='repeat', default=5,
+                     help='runs per measurement', type=int)
+    sys.exit(main(cmd.parse_args()))
@@ -0,0 +1,86 @@
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ray'))
+
+from cpp.transformer import RayToCpp
+from generator import RayProgramGenerator
+from parser_cache import ParserCache, PARSER_OPTIONS
+from phase.lowering import RayLowering
+
+
+class CountingSink(object):
+    # NOTE: stands in for the output file, keeps the byte count and drops
+    # the text so the sink itself holds no memory.
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+
+def emit(program):
+    sink = CountingSink()
+    RayToCpp(".").processTree(program, sink)
+    return sink.size
+
+
+def timeEmit(program, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        size = emit(program)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+def peakBytes(program):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        emit(program)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def main(args):
+    cache = ParserCache(enabled=False)
+    parser = cache.loadParser("grammer/ray.ebnf", transformer=RayLowering(),
+                              **PARSER_OPTIONS["lalr"])
+    generator = RayProgramGenerator(functions=args.functions)
+    print("%10s %12s %12s %12s %12s" % ("lines", "cpp bytes", "seconds",
+                                        "MB/sec", "peak MB"))
+    for size in args.sizes:
+        source = generator.generateLines(size)
+        program = parser.parse(source)
+        elapsed, cpp_bytes = timeEmit(program, args.repeat)
+        peak = peakBytes(program)
+        print("%10d %12d %12.4f %12.2f %12.2f" % (
+            source.count("\n"), cpp_bytes, elapsed,
+            cpp_bytes / elapsed / (1024.0 * 1024.0),
+            peak / (1024.0 * 1024.0)))
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Ray c++ emitter throughput,'
+                                  ' bytes of c++ written per second and'
+                                  ' peak memory while writing')
+    cmd.add_argument('--sizes', dest='sizes', nargs='+', type=int,
+                     default=[1000, 4000, 16000],
+                     help='approximate program sizes in lines')
+    cmd.add_argument('--functions', dest='functions', default=10, type=int,
+                     help='functions per module, raise it to emit a few'
+                          ' huge modules')
+    cmd.add_argument('--repeat', dest='repeat', default=3,
+                     help='runs per measurement', type=int)
+    sys.exit(main(cmd.parse_args()))
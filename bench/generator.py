@@ -0,0 +1,157 @@
+import argparse
+import os
+import string
+
+
+def letterName(index):
+    # NOTE: include paths only allow lower case letters, so file names are
+    # spelled in base 26.
+    name = ""
+    while True:
+        name = string.ascii_lowercase[index % 26] + name
+        index = index // 26 - 1
+        if index < 0:
+            return name
+
+
+class RayProgramGenerator(object):
+
+    def __init__(self, functions=10, statements=8, depth=1,
+                 string_length=16, block_calls=False):
+        self.functions = functions
+        self.statements = statements
+        self.depth = depth
+        self.string_length = string_length
+        self.block_calls = block_calls
+
+    def generateModule(self, name, imports=()):
+        lines = ["module %s {" % name, "    import Runtime;"]
+        for module in imports:
+            lines.append("    import %s;" % module)
+        for func in range(self.functions):
+            lines += self.generateFunction("func%s" % func, imports)
+        lines.append("}")
+        return lines
+
+    def generateFunction(self, name, imports=()):
+        lines = ["    def func Int32 %s(Int32: a, Int32: b){" % name,
+                 "        Int32 x := a + b * 2;"]
+        for stmt in range(self.statements):
+            lines += self.generateStatement(stmt, self.depth, "        ")
+        for module in imports:
+            lines.append("        x := x + func0(x, %s);" % len(module))
+        lines += ["        return x - 1;", "    }"]
+        return lines
+
+    def generateStatement(self, index, depth, indent):
+        kind = index % 4
+        if kind == 0:
+            return [indent + "x := x + %s;" % index]
+        if kind == 1:
+            return ([indent + "if(x < %s){" % index] +
+                    self.generateBlock(index, depth, indent) +
+                    [indent + "}else{",
+                     indent + "    x := -x;",
+                     indent + "}"])
+        if kind == 2:
+            return ([indent + "while(x > %s){" % index] +
+                    self.generateBlock(index, depth, indent) +
+                    [indent + "}"])
+        return [indent + "print(%s);" % self.generateString(index)]
+
+    def generateBlock(self, index, depth, indent):
+        lines = [indent + "    x := x / 2 - a;"]
+        if self.block_calls:
+            lines.append(indent + "    print(%s);" % self.generateString(
+                index))
+        if depth > 1:
+            # NOTE: only nest if and while blocks, calls stay at function
+            # level like in the hand written sources.
+            lines += self.generateStatement(index % 2 + 1, depth - 1,
+                                            indent + "    ")
+        return lines
+
+    def generateString(self, index):
+        text = "statement %s " % index
+        text += "x" * max(0, self.string_length - len(text))
+        return "\"%s\"" % text
+
+    def generateProgram(self, modules):
+        lines = []
+        for module in range(modules):
+            lines += self.generateModule("Module%s" % module)
+        return "\n".join(lines) + "\n"
+
+    def generateLines(self, target_lines):
+        # NOTE: grows the module count until the program reaches the target
+        # size, handy for throughput curves over source length.
+        module_lines = len(self.generateModule("Module0"))
+        modules = max(1, target_lines // module_lines)
+        return self.generateProgram(modules)
+
+    def generateProject(self, directory, modules, fanout=2, main_calls=0):
+        # NOTE: module i includes and imports the next fanout modules, which
+        # gives a wide include graph with plenty of shared (diamond) edges.
+        # main calls func i of module i for the first main_calls modules.
+        os.makedirs(directory, exist_ok=True)
+        lines = 0
+        names = [letterName(module) for module in range(modules)]
+        for module, name in enumerate(names):
+            deps = list(range(module + 1, min(modules, module + 1 + fanout)))
+            source = ["@@include %s;" % names[dep] for dep in deps]
+            source += self.generateModule(
+                "Module%s" % name.capitalize(),
+                ["Module%s" % names[dep].capitalize() for dep in deps])
+            lines += self.writeFile(directory, name, source)
+        source = ["@@include %s;" % name for name in names[:fanout + 1]]
+        source += ["from Runtime import Int32;",
+                   "from Runtime import CStringPtr;",
+                   "def func Int32 main( Int32: argc, CStringPtr: args){"]
+        calls = range(min(main_calls, modules, self.functions))
+        if calls:
+            source += ["    from Module%s import func%s;" % (
+                names[module].capitalize(), module) for module in calls]
+            source.append("    Int32 x := 0;")
+            source += ["    x := x + func%s(argc, %s);" % (module, module)
+                       for module in calls]
+            source.append("    return x;")
+        else:
+            source.append("    return 0;")
+        source.append("}")
+        lines += self.writeFile(directory, "main", source)
+        return lines
+
+    def writeFile(self, directory, name, lines):
+        with open(os.path.join(directory, "%s.ray" % name), "w") as out:
+            out.write("\n".join(lines) + "\n")
+        return len(lines)
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Synthetic ray program generator')
+    cmd.add_argument('--lines', dest='lines', default=1000,
+                     help='approximate number of lines', type=int)
+    cmd.add_argument('--project', dest='project', default=None, type=str,
+                     help='write a multi file project to this directory'
+                          ' instead of printing a single program')
+    cmd.add_argument('--modules', dest='modules', default=8, type=int,
+                     help='modules in the generated project')
+    cmd.add_argument('--fanout', dest='fanout', default=2, type=int,
+                     help='includes per generated module')
+    cmd.add_argument('--main-calls', dest='main_calls', default=0, type=int,
+                     help='modules of the project main calls into')
+    cmd.add_argument('--functions', dest='functions', default=10, type=int,
+                     help='functions per module')
+    cmd.add_argument('--depth', dest='depth', default=1, type=int,
+                     help='if/while nesting depth')
+    cmd.add_argument('--string-length', dest='string_length', default=16,
+                     type=int, help='length of generated string literals')
+    args = cmd.parse_args()
+    generator = RayProgramGenerator(functions=args.functions,
+                                    depth=args.depth,
+                                    string_length=args.string_length)
+    if args.project:
+        generator.generateProject(args.project, args.modules, args.fanout,
+                                  args.main_calls)
+    else:
+        print(generator.generateLines(args.lines), end="")
@@ -0,0 +1,112 @@
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ray'))
+
+from generator import RayProgramGenerator
+from parser_cache import ParserCache, PARSER_OPTIONS
+from phase.inference import SymbolProcessor
+from phase.lowering import RayLowering
+
+RUNTIME_HEADER = os.path.join(os.path.dirname(__file__), '..', 'runtime',
+                              'header.ray')
+
+
+class CopyingImports(SymbolProcessor):
+    # NOTE: the import used before symbol.ScopeIndex.importScope, every
+    # symbol of the module copied into the importing scope.
+
+    def visitImport(self, node):
+        module = self.module_table.get(node.module)
+        if module:
+            for sym in module.scope.symbols.values():
+                self.declareSymbol(sym.name, sym)
+        else:
+            self.defered_imports[node] = self.scope
+
+
+def runtimeSource(extra_symbols):
+    # NOTE: a second Runtime block merges into the same scope, it pads the
+    # module with extern functions to make it as large as asked.
+    with open(RUNTIME_HEADER) as header:
+        lines = [header.read(), "module Runtime {"]
+    for index in range(extra_symbols):
+        lines.append("    @@func Void helper%s(CString: msg);" % index)
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def timeInference(processor_type, program, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        processor = processor_type()
+        start = time.perf_counter()
+        processor.processTree(program)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, processor
+
+
+def retainedBytes(processor_type, program):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        processor = processor_type()
+        processor.processTree(program)
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del processor
+    return retained
+
+
+def signature(processor):
+    deps = sorted((parent.qualified_name,
+                   [sym.qualified_name for sym in deps])
+                  for parent, deps in processor.depends_on.items())
+    return sorted(processor.symbol_table), deps, len(processor.defered_deps)
+
+
+def main(args):
+    cache = ParserCache(enabled=False)
+    parser = cache.loadParser("grammer/ray.ebnf", transformer=RayLowering(),
+                              **PARSER_OPTIONS["lalr"])
+    generator = RayProgramGenerator(functions=1, statements=4)
+    source = generator.generateProgram(args.modules)
+    print("%10s %10s %10s %10s %10s %12s %12s %10s" % (
+        "symbols", "importers", "copy s", "view s", "speedup", "copy MB",
+        "view MB", "identical"))
+    for extra in args.runtime_symbols:
+        program = parser.parse(runtimeSource(extra) + source)
+        copied, copied_result = timeInference(CopyingImports, program,
+                                              args.repeat)
+        viewed, viewed_result = timeInference(SymbolProcessor, program,
+                                              args.repeat)
+        runtime = viewed_result.module_table["Runtime"].scope
+        print("%10d %10d %10.4f %10.4f %10.2f %12.2f %12.2f %10s" % (
+            len(runtime.symbols), args.modules, copied, viewed,
+            copied / viewed,
+            retainedBytes(CopyingImports, program) / (1024.0 * 1024.0),
+            retainedBytes(SymbolProcessor, program) / (1024.0 * 1024.0),
+            signature(copied_result) == signature(viewed_result)))
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Ray import cost, copying'
+                                  ' module symbols into every importer'
+                                  ' against chained import views')
+    cmd.add_argument('--modules', dest='modules', default=500, type=int,
+                     help='generated modules, each one imports Runtime')
+    cmd.add_argument('--runtime-symbols', dest='runtime_symbols', nargs='+',
+                     type=int, default=[0, 500, 2000, 8000],
+                     help='extern functions added to the Runtime module')
+    cmd.add_argument('--repeat', dest='repeat', default=3,
+                     help='runs per measurement', type=int)
+    sys.exit(main(cmd.parse_args()))
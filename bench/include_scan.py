@@ -0,0 +1,95 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ray'))
+
+from generator import RayProgramGenerator
+from parser_cache import ParserCache
+from phase.preprocessor import (IncludeProcessor, loadIncludeParser,
+                                parseIncludeFile, scanIncludeFile)
+
+
+def writeInput(directory, megabytes, includes):
+    generator = RayProgramGenerator()
+    lines = ["@@include dep%s;" % index for index in range(includes)]
+    source = generator.generateProgram(1)
+    copies = max(1, megabytes * 1024 * 1024 // len(source))
+    filename = os.path.join(directory, "input%smb.ray" % megabytes)
+    with open(filename, "w") as out:
+        out.write("\n".join(lines) + "\n")
+        for _ in range(copies):
+            out.write(source)
+    return filename
+
+
+def timeBest(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def scanLark(processor, parser, filename):
+    tree, _ = parseIncludeFile(filename, parser)
+    out = StringIO()
+    processor.processTree(tree, out)
+    return out.getvalue()
+
+
+def scanFast(filename):
+    source, _ = scanIncludeFile(filename)
+    return source.text
+
+
+def main(args):
+    parser = loadIncludeParser(ParserCache(enabled=False))
+    processor = IncludeProcessor(".", scanner="lark")
+    work_dir = tempfile.mkdtemp(prefix="ray-scan-")
+    try:
+        print("%10s %8s %12s %12s" % ("scanner", "MB", "seconds", "MB/sec"))
+        for megabytes in args.sizes:
+            filename = writeInput(work_dir, megabytes, args.includes)
+            size = os.path.getsize(filename) / (1024.0 * 1024.0)
+            texts = []
+            for name in args.scanners:
+                if name == "lark":
+                    elapsed, text = timeBest(args.repeat, lambda: scanLark(
+                        processor, parser, filename))
+                else:
+                    elapsed, text = timeBest(args.repeat,
+                                             lambda: scanFast(filename))
+                texts.append(text)
+                print("%10s %8.1f %12.4f %12.1f" % (name, size, elapsed,
+                                                    size / elapsed))
+            # NOTE: the lark path drops indentation and blank lines, so the
+            # outputs are only comparable without whitespace.
+            stripped = ["".join(text.split()) for text in texts]
+            if any(text != stripped[0] for text in stripped[1:]):
+                print("scanner output differs at %.1f MB" % size)
+                return 1
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Ray include scanner benchmark')
+    cmd.add_argument('--sizes', dest='sizes', nargs='+', type=int,
+                     default=[1, 4, 16], help='input sizes in megabytes')
+    cmd.add_argument('--includes', dest='includes', default=8, type=int,
+                     help='include directives at the top of the input')
+    cmd.add_argument('--scanners', dest='scanners', nargs='+',
+                     default=["lark", "fast"], choices=["lark", "fast"],
+                     help='scanners to compare')
+    cmd.add_argument('--repeat', dest='repeat', default=3,
+                     help='runs per measurement', type=int)
+    sys.exit(main(cmd.parse_args()))
@@ -0,0 +1,80 @@
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ray'))
+
+from compact_ir import CompactTree
+from generator import RayProgramGenerator
+from parser_cache import ParserCache, PARSER_OPTIONS
+from phase.lowering import RayLowering
+
+
+def timeParse(parse, source, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        parse(source)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def retainedBytes(parse, source):
+    # NOTE: memory still held once the parse returns, which is what the
+    # later phases have to live with.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tree = parse(source)
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del tree
+    return retained
+
+
+def main(args):
+    cache = ParserCache(enabled=False)
+    tree_parser = cache.loadParser("grammer/ray.ebnf",
+                                   propagate_positions=True,
+                                   **PARSER_OPTIONS["lalr"])
+    ast_parser = cache.loadParser("grammer/ray.ebnf",
+                                  transformer=RayLowering(),
+                                  **PARSER_OPTIONS["lalr"])
+    parsers = {
+        "tree": tree_parser.parse,
+        "ast": ast_parser.parse,
+        "compact": lambda source: CompactTree().packProgram(
+            ast_parser.parse(source)),
+    }
+    generator = RayProgramGenerator()
+    print("%8s %10s %12s %12s %14s" % ("path", "lines", "seconds",
+                                       "lines/sec", "retained MB"))
+    for size in args.sizes:
+        source = generator.generateLines(size)
+        lines = source.count("\n")
+        for name, parse in parsers.items():
+            elapsed = timeParse(parse, source, args.repeat)
+            retained = retainedBytes(parse, source)
+            print("%8s %10d %12.4f %12.0f %14.2f" % (
+                name, lines, elapsed, lines / elapsed,
+                retained / (1024.0 * 1024.0)))
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Ray lowering benchmark, lark'
+                                  ' parse trees against ray_ast nodes and'
+                                  ' the compact ir')
+    cmd.add_argument('--sizes', dest='sizes', nargs='+', type=int,
+                     default=[1000, 4000, 16000],
+                     help='approximate program sizes in lines')
+    cmd.add_argument('--repeat', dest='repeat', default=3,
+                     help='runs per measurement', type=int)
+    sys.exit(main(cmd.parse_args()))
@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ray'))
+
+from generator import RayProgramGenerator
+from parser_cache import ParserCache, PARSER_OPTIONS
+
+
+def timeParse(parser, source, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser.parse(source)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(args):
+    cache = ParserCache(enabled=False)
+    parsers = {}
+    for mode in args.parsers:
+        # NOTE: the options ray.py parses with, positions come from the
+        # tokens so propagate_positions stays off.
+        parsers[mode] = cache.loadParser("grammer/ray.ebnf",
+                                         **PARSER_OPTIONS[mode])
+    generator = RayProgramGenerator()
+    print("%10s %10s %14s %12s" % ("parser", "lines", "seconds", "lines/sec"))
+    for size in args.sizes:
+        source = generator.generateLines(size)
+        lines = source.count("\n")
+        trees = []
+        for mode in args.parsers:
+            elapsed = timeParse(parsers[mode], source, args.repeat)
+            trees.append(parsers[mode].parse(source))
+            print("%10s %10d %14.4f %12.0f" % (mode, lines, elapsed,
+                                               lines / elapsed))
+        if any(tree != trees[0] for tree in trees[1:]):
+            print("parse trees differ at %d lines" % lines)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Ray parse throughput benchmark')
+    cmd.add_argument('--sizes', dest='sizes', nargs='+', type=int,
+                     default=[250, 1000, 4000],
+                     help='approximate program sizes in lines')
+    cmd.add_argument('--parsers', dest='parsers', nargs='+',
+                     default=["lalr", "earley"], choices=sorted(PARSER_OPTIONS),
+                     help='parsers to compare')
+    cmd.add_argument('--repeat', dest='repeat', default=3,
+                     help='runs per measurement', type=int)
+    sys.exit(main(cmd.parse_args()))
@@ -0,0 +1,51 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ray'))
+
+from parser_cache import ParserCache
+
+
+GRAMMARS = [
+    ("grammer/ray.ebnf", {"propagate_positions": True}),
+    ("grammer/include.ebnf", {"parser": 'lalr', "lexer": 'standard'}),
+]
+
+
+def timeLoad(cache_dir, grammar_file, options, enabled=True):
+    cache = ParserCache(cache_dir, enabled=enabled)
+    start = time.perf_counter()
+    cache.loadParser(grammar_file, **options)
+    return time.perf_counter() - start
+
+
+def main(args):
+    cache_dir = tempfile.mkdtemp(prefix="ray-parser-cache-")
+    try:
+        print("%-24s %12s %12s %12s" % ("grammar", "uncached", "cold", "warm"))
+        for grammar_file, options in GRAMMARS:
+            uncached = min(timeLoad(cache_dir, grammar_file, options, False)
+                           for _ in range(args.repeat))
+            cold = []
+            warm = []
+            for _ in range(args.repeat):
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                cold.append(timeLoad(cache_dir, grammar_file, options))
+                warm.append(timeLoad(cache_dir, grammar_file, options))
+            print("%-24s %10.2fms %10.2fms %10.2fms" % (
+                grammar_file, uncached * 1000, min(cold) * 1000,
+                min(warm) * 1000))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(
+        description='Ray parser cache cold/warm start benchmark')
+    cmd.add_argument('--repeat', dest='repeat', default=5,
+                     help='runs per measurement', type=int)
+    main(cmd.parse_args())
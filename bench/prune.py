@@ -0,0 +1,83 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from generator import RayProgramGenerator
+
+RAY_PY = os.path.join(os.path.dirname(__file__), '..', 'ray', 'ray.py')
+
+
+def transpile(project, build_dir, prune):
+    command = [sys.executable, RAY_PY, "--prefix", project,
+               "--build-dir", build_dir]
+    if prune:
+        command.append("--prune")
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return os.path.join(build_dir, "output.cpp")
+
+
+def timeCompile(compiler, flags, cpp_file, repeat):
+    # NOTE: a single translation unit compiled to an object, which is the
+    # part of the build pruning shortens.
+    object_file = cpp_file[:-len(".cpp")] + ".o"
+    command = [compiler, "-std=c++17", "-c", cpp_file,
+               "-o", object_file] + flags.split()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, os.path.getsize(object_file)
+
+
+def main(args):
+    generator = RayProgramGenerator(functions=args.functions)
+    print("%6s %8s %10s %12s %12s %12s" % ("calls", "output", "cpp bytes",
+                                           "compile s", "object bytes",
+                                           "speedup"))
+    with tempfile.TemporaryDirectory() as work_dir:
+        for main_calls in args.main_calls:
+            project = os.path.join(work_dir, "project%s" % main_calls)
+            generator.generateProject(project, args.modules, args.fanout,
+                                      main_calls)
+            full = None
+            for prune in (False, True):
+                build_dir = os.path.join(project, "pruned" if prune
+                                         else "full")
+                cpp_file = transpile(project, build_dir, prune)
+                elapsed, object_bytes = timeCompile(
+                    args.compiler, args.flags, cpp_file, args.repeat)
+                if full is None:
+                    full = elapsed
+                print("%6d %8s %10d %12.3f %12d %12.2f" % (
+                    main_calls, "pruned" if prune else "full",
+                    os.path.getsize(cpp_file), elapsed, object_bytes,
+                    full / elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Ray dead code elimination,'
+                                  ' c++ size, compile time and object size'
+                                  ' of a generated project with and without'
+                                  ' --prune')
+    cmd.add_argument('--modules', dest='modules', default=64, type=int,
+                     help='modules in the generated project')
+    cmd.add_argument('--fanout', dest='fanout', default=2, type=int,
+                     help='includes per generated module')
+    cmd.add_argument('--functions', dest='functions', default=10, type=int,
+                     help='functions per module')
+    cmd.add_argument('--main-calls', dest='main_calls', nargs='+', type=int,
+                     default=[1, 4, 10],
+                     help='modules main calls into, one project each')
+    cmd.add_argument('--compiler', dest='compiler', default="g++",
+                     help='c++ compiler', type=str)
+    cmd.add_argument('--flags', dest='flags', default="-O2",
+                     help='extra compiler flags', type=str)
+    cmd.add_argument('--repeat', dest='repeat', default=1,
+                     help='compiles per measurement', type=int)
+    sys.exit(main(cmd.parse_args()))
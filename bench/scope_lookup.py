@@ -0,0 +1,156 @@
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ray'))
+
+from generator import RayProgramGenerator
+from parser_cache import ParserCache, PARSER_OPTIONS
+from phase.inference import SymbolProcessor
+from phase.lowering import RayLowering
+from symbol import ScopeIndex
+
+RUNTIME_HEADER = os.path.join(os.path.dirname(__file__), '..', 'runtime',
+                              'header.ray')
+
+
+def legacyLookup(scope, symbol_name):
+    # NOTE: the lookup used before symbol.ScopeIndex, a plain walk up the
+    # scope chain on every call. Imports are looked through depth first in
+    # import order like the index does, so both resolve every name alike.
+    sym = None
+    while scope is not None:
+        sym = scope.symbols.get(symbol_name)
+        if sym:
+            break
+        visited = set()
+        stack = scope.imports[::-1]
+        while stack:
+            module_scope = stack.pop()
+            if module_scope in visited:
+                continue
+            visited.add(module_scope)
+            sym = module_scope.symbols.get(symbol_name)
+            if sym:
+                return sym
+            stack += module_scope.imports[::-1]
+        scope = scope.parent
+    return sym
+
+
+class LegacyProcessor(SymbolProcessor):
+
+    def lookupSymbol(self, scope, symbol_name):
+        return legacyLookup(scope, symbol_name)
+
+
+class RecordingProcessor(SymbolProcessor):
+
+    def __init__(self):
+        super().__init__()
+        self.lookups = []
+
+    def lookupSymbol(self, scope, symbol_name):
+        self.lookups.append((scope, symbol_name))
+        return super().lookupSymbol(scope, symbol_name)
+
+
+def forgetResolved(lookups):
+    for scope, _ in lookups:
+        while scope is not None:
+            scope.resolved.clear()
+            scope = scope.parent
+
+
+def timeInference(processor_type, program, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        processor = processor_type()
+        start = time.perf_counter()
+        processor.processTree(program)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, processor
+
+
+def timeLookups(lookup, lookups, repeat, reset=None):
+    # NOTE: replays the lookups one inference pass made, the index starts
+    # cold on every run so its memos are built inside the timing.
+    best = None
+    for _ in range(repeat):
+        if reset is not None:
+            lookup = reset()
+        gc.collect()
+        start = time.perf_counter()
+        for scope, name in lookups:
+            lookup(scope, name)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def scopeDepth(scope):
+    depth = 0
+    while scope is not None:
+        depth += 1
+        scope = scope.parent
+    return depth
+
+
+def signature(processor):
+    deps = sorted((parent.qualified_name, len(deps))
+                  for parent, deps in processor.depends_on.items())
+    return sorted(processor.symbol_table), deps, len(processor.defered_deps)
+
+
+def main(args):
+    cache = ParserCache(enabled=False)
+    parser = cache.loadParser("grammer/ray.ebnf", transformer=RayLowering(),
+                              **PARSER_OPTIONS["lalr"])
+    with open(RUNTIME_HEADER) as header:
+        runtime = header.read()
+    print("%6s %10s %10s %8s %12s %12s %12s %12s %10s" % (
+        "depth", "lines", "lookups", "chain", "legacy ns", "indexed ns",
+        "legacy s", "indexed s", "identical"))
+    for depth in args.depths:
+        generator = RayProgramGenerator(depth=depth, block_calls=True)
+        source = generator.generateLines(args.lines)
+        program = parser.parse(runtime + source)
+        recorder = RecordingProcessor()
+        recorder.processTree(program)
+        lookups = recorder.lookups
+
+        def freshIndex():
+            forgetResolved(lookups)
+            return ScopeIndex().lookup
+
+        legacy = timeLookups(legacyLookup, lookups, args.repeat)
+        indexed = timeLookups(None, lookups, args.repeat, reset=freshIndex)
+        legacy_pass, legacy_result = timeInference(LegacyProcessor, program,
+                                                   args.repeat)
+        indexed_pass, indexed_result = timeInference(SymbolProcessor,
+                                                     program, args.repeat)
+        print("%6d %10d %10d %8.1f %12.0f %12.0f %12.4f %12.4f %10s" % (
+            depth, source.count("\n"), len(lookups),
+            sum(scopeDepth(scope) for scope, _ in lookups) / len(lookups),
+            legacy * 1e9 / len(lookups), indexed * 1e9 / len(lookups),
+            legacy_pass, indexed_pass,
+            signature(legacy_result) == signature(indexed_result)))
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Ray symbol resolution on'
+                                  ' deeply nested code, scope chain walks'
+                                  ' against the memoized scope index')
+    cmd.add_argument('--lines', dest='lines', default=16000, type=int,
+                     help='approximate program size in lines')
+    cmd.add_argument('--depths', dest='depths', nargs='+', type=int,
+                     default=[1, 8, 16, 32, 64],
+                     help='if and while nesting depths to run')
+    cmd.add_argument('--repeat', dest='repeat', default=3,
+                     help='runs per measurement', type=int)
+    sys.exit(main(cmd.parse_args()))
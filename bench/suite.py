@@ -0,0 +1,148 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ray'))
+
+from generator import RayProgramGenerator
+from timings import PhaseTimer
+
+import ray
+
+
+def runPipeline(prefix, build_dir, trace_memory, extra_args=()):
+    args = ray.parseArgs(["--prefix", prefix, "--build-dir", build_dir] +
+                         list(extra_args))
+    timer = PhaseTimer(trace_memory=trace_memory)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ray.main(args, timer)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return timer.toDict()
+
+
+def runSize(generator, modules, args):
+    work_dir = tempfile.mkdtemp(prefix="ray-bench-")
+    try:
+        prefix = os.path.join(work_dir, "src")
+        build_dir = os.path.join(work_dir, "build")
+        os.makedirs(build_dir)
+        lines = generator.generateProject(prefix, modules, args.fanout)
+        best = None
+        for _ in range(args.repeat):
+            result = runPipeline(prefix, build_dir, False, args.ray_args)
+            if best is None or result["total"]["wall"] < best["total"]["wall"]:
+                best = result
+        # NOTE: peak memory comes from a separate traced run so tracemalloc
+        # overhead does not leak into the timings.
+        traced = runPipeline(prefix, build_dir, True, args.ray_args)
+        for name, timing in traced["phases"].items():
+            best["phases"][name]["peak_bytes"] = timing["peak_bytes"]
+        best["modules"] = modules
+        best["lines"] = lines
+        return best
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def report(results, out=sys.stdout):
+    phases = list(results[0]["phases"])
+    print("%8s %8s " % ("modules", "lines") +
+          " ".join("%12s" % name for name in phases), file=out)
+    for result in results:
+        print("%8d %8d " % (result["modules"], result["lines"]) +
+              " ".join("%10.1fms" % (result["phases"][name]["wall"] * 1000)
+                       for name in phases), file=out)
+    print(file=out)
+    print("%8s %8s " % ("modules", "lines") +
+          " ".join("%12s" % name for name in phases), file=out)
+    for result in results:
+        print("%8d %8d " % (result["modules"], result["lines"]) +
+              " ".join("%10.1fKB" % (
+                  result["phases"][name]["peak_bytes"] / 1024.0)
+                       for name in phases), file=out)
+
+
+def compare(results, baseline, threshold, min_time):
+    regressions = []
+    previous = {entry["modules"]: entry for entry in baseline["results"]}
+    for result in results:
+        old = previous.get(result["modules"])
+        if old is None:
+            continue
+        for name, timing in result["phases"].items():
+            old_timing = old["phases"].get(name)
+            if old_timing is None:
+                continue
+            for metric, floor in (("wall", min_time), ("peak_bytes", 1024)):
+                before = old_timing.get(metric, 0)
+                after = timing.get(metric, 0)
+                if before >= floor and after > before * (1 + threshold):
+                    regressions.append((result["modules"], name, metric,
+                                        before, after))
+    return regressions
+
+
+def main(args):
+    generator = RayProgramGenerator(functions=args.functions,
+                                    statements=args.statements,
+                                    depth=args.depth,
+                                    string_length=args.string_length)
+    results = [runSize(generator, modules, args) for modules in args.modules]
+    report(results)
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump({"config": vars(args), "results": results}, out,
+                      indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold,
+                              args.min_time)
+        for modules, name, metric, before, after in regressions:
+            print("regression: %d modules %s %s %.4g -> %.4g (+%.0f%%)" % (
+                modules, name, metric, before, after,
+                (after / before - 1) * 100))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = argparse.ArgumentParser(description='Ray compiler benchmark suite')
+    cmd.add_argument('--modules', dest='modules', nargs='+', type=int,
+                     default=[1, 4, 16, 64],
+                     help='generated module counts to measure')
+    cmd.add_argument('--functions', dest='functions', default=10, type=int,
+                     help='functions per module')
+    cmd.add_argument('--statements', dest='statements', default=8, type=int,
+                     help='statements per function')
+    cmd.add_argument('--depth', dest='depth', default=3, type=int,
+                     help='if/while nesting depth')
+    cmd.add_argument('--string-length', dest='string_length', default=64,
+                     type=int, help='length of generated string literals')
+    cmd.add_argument('--fanout', dest='fanout', default=3, type=int,
+                     help='includes per generated module')
+    cmd.add_argument('--repeat', dest='repeat', default=3, type=int,
+                     help='timed runs per size, the fastest is kept')
+    cmd.add_argument('--output', dest='output', default=None, type=str,
+                     help='write the results as json')
+    cmd.add_argument('--baseline', dest='baseline', default=None, type=str,
+                     help='json results of an earlier run to compare with')
+    cmd.add_argument('--threshold', dest='threshold', default=0.2,
+                     type=float, help='allowed relative slow down')
+    cmd.add_argument('--min-time', dest='min_time', default=0.005,
+                     type=float,
+                     help='phases faster than this in the baseline are not'
+                          ' checked for time regressions')
+    cmd.add_argument('--ray-args', dest='ray_args', nargs=argparse.REMAINDER,
+                     default=[], help='extra arguments passed to ray.py')
+    sys.exit(main(cmd.parse_args()))
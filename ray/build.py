@@ -0,0 +1,378 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+
+# NOTE: the compiler modules use flat imports relative to this directory,
+# also when this module is loaded through the installed ray entry point.
+RAY_DIR = os.path.dirname(os.path.abspath(__file__))
+if RAY_DIR not in sys.path:
+    sys.path.insert(0, RAY_DIR)
+
+from phase.preprocessor import IncludeProcessor
+from include_cache import IncludeCache
+from parser_cache import ParserCache
+
+GRAMMARS = ["grammer/ray.ebnf", "grammer/include.ebnf"]
+
+PROFILES = {
+    "release": {
+        "optimizations": ["-O3", "-g0", "-march=native"],
+        "extra_features": ["-flto=thin", "-fwhole-program-vtables"],
+        "sanatizers": [],
+        "error_checks": ["-pedantic"],
+    },
+    "debug": {
+        "optimizations": ["-Os", "-Og", "-g", "-glldb", "-fstandalone-debug",
+                          "-fno-omit-frame-pointer"],
+        "extra_features": [],
+        "sanatizers": ["-fsanitize=undefined,address"],
+        "error_checks": ["-Werror", "-Wextra-tokens",
+                         "-Wbind-to-temporary-copy", "-pedantic"],
+    },
+}
+
+STDLIB = ["-stdlib=libc++", "-lc++", "-lc++abi"]
+FEATURES = ["-std=c++17", "-fpic", "-pie", "-fno-exceptions",
+            "-fstrict-vtable-pointers", "-ffast-math", "-fvisibility=protected"]
+LINKER = ["-fuse-ld=lld"]
+# NOTE: dropped when compiling single translation units, clang warns about
+# unused linker flags and the debug profile builds with -Werror.
+LINK_ONLY = ["-lc++", "-lc++abi", "-pie"] + LINKER
+
+
+class ContentStore(object):
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.hits = 0
+        self.misses = 0
+
+    def objectFile(self, key):
+        return os.path.join(self.store_dir, key[:2], key)
+
+    def fetch(self, key, target):
+        cached = self.objectFile(key)
+        if not os.path.exists(cached):
+            self.misses += 1
+            return False
+        self.hits += 1
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        shutil.copy2(cached, target)
+        return True
+
+    def store(self, key, source):
+        cached = self.objectFile(key)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        tmp_file = "%s.%s.tmp" % (cached, os.getpid())
+        shutil.copy2(source, tmp_file)
+        os.replace(tmp_file, cached)
+
+    def fetchTree(self, key, target_dir):
+        manifest = self.objectFile(key)
+        if not os.path.exists(manifest):
+            self.misses += 1
+            return False
+        self.hits += 1
+        with open(manifest) as input:
+            files = json.load(input)
+        os.makedirs(target_dir, exist_ok=True)
+        for filename in os.listdir(target_dir):
+            if filename not in files:
+                os.remove(os.path.join(target_dir, filename))
+        for filename, file_key in files.items():
+            target = os.path.join(target_dir, filename)
+            # NOTE: unchanged files keep their mtime for the compile step.
+            if os.path.exists(target) and fileKey(target) == file_key:
+                continue
+            shutil.copy2(self.objectFile(file_key), target)
+        return True
+
+    def storeTree(self, key, source_dir):
+        files = {}
+        for filename in sorted(os.listdir(source_dir)):
+            source = os.path.join(source_dir, filename)
+            files[filename] = fileKey(source)
+            self.store(files[filename], source)
+        manifest = "%s.manifest" % source_dir
+        with open(manifest, "w") as out:
+            json.dump(files, out, indent=2, sort_keys=True)
+        self.store(key, manifest)
+        os.remove(manifest)
+
+
+def hashFile(digest, filename):
+    digest.update(filename.encode('utf8'))
+    digest.update(b'\0')
+    with open(filename, "rb") as input:
+        digest.update(input.read())
+    digest.update(b'\0')
+
+
+def fileKey(filename):
+    digest = hashlib.sha256(b'ray-file\0')
+    with open(filename, "rb") as input:
+        digest.update(input.read())
+    return digest.hexdigest()
+
+
+def includeClosure(args):
+    parser_cache = ParserCache("%s/cache" % args.build_dir,
+                               enabled=args.parser_cache)
+    include_cache = IncludeCache("%s/cache" % args.build_dir)
+    preprocessor = IncludeProcessor(args.prefix, parser_cache=parser_cache,
+                                    include_cache=include_cache,
+                                    include_dirs=args.include_dirs)
+    preprocessor.processSrc("%s/%s" % (args.prefix, args.source))
+    return sorted(preprocessor.all_includes)
+
+
+def transpileKey(args, sources):
+    digest = hashlib.sha256(b'ray-transpile\0')
+    compiler_sources = sorted(glob.glob("%s/**/*.py" % RAY_DIR,
+                                        recursive=True))
+    for filename in sources + GRAMMARS + compiler_sources:
+        hashFile(digest, filename)
+    digest.update(repr(transpileArgs(args)).encode('utf8'))
+    digest.update(repr(formatCommand(args)).encode('utf8'))
+    return digest.hexdigest()
+
+
+def compileKey(inputs, command):
+    digest = hashlib.sha256(b'ray-compile\0')
+    for filename in inputs:
+        with open(filename, "rb") as input:
+            digest.update(input.read())
+        digest.update(b'\0')
+    digest.update(repr(command).encode('utf8'))
+    return digest.hexdigest()
+
+
+def splitDir(args):
+    if args.split_modules:
+        return "%s/modules" % args.build_dir
+    if args.shards:
+        return "%s/shards" % args.build_dir
+    return None
+
+
+def transpileArgs(args):
+    split_args = []
+    if args.split_modules:
+        split_args = ["--split-modules"]
+    elif args.shards:
+        split_args = ["--shards", str(args.shards)]
+    elif args.prune:
+        split_args = ["--prune"]
+    include_args = []
+    for include_dir in args.include_dirs:
+        include_args += ["--include-dir", include_dir]
+    return ["--prefix", args.prefix, "--src", args.source,
+            "--build-dir", args.build_dir, "--out", args.out,
+            "--parser", args.parser] + include_args + split_args + \
+        args.ray_args
+
+
+def formatCommand(args):
+    if not args.format:
+        return None
+    return [args.clang_format, "-i"]
+
+
+def compileCommand(args, sources, binary):
+    profile = PROFILES["release" if args.release else "debug"]
+    return ([args.compiler] + LINKER + profile["optimizations"] +
+            ["-o", binary] + STDLIB + FEATURES + profile["extra_features"] +
+            profile["sanatizers"] + profile["error_checks"] +
+            args.extra_flags.split() + sources)
+
+
+def objectCommand(args, cpp_file, object_file):
+    command = compileCommand(args, [cpp_file], object_file)
+    return [flag for flag in command if flag not in LINK_ONLY] + ["-c"]
+
+
+def run(command, verbose, quiet=False):
+    if verbose:
+        print(" ".join(command))
+    stdout = subprocess.DEVNULL if quiet and not verbose else None
+    subprocess.check_call(command, stdout=stdout)
+
+
+def transpile(args, store, cpp_files):
+    sources = includeClosure(args)
+    key = transpileKey(args, sources)
+    split_dir = splitDir(args)
+    if split_dir:
+        hit = store.fetchTree(key, split_dir)
+    else:
+        hit = store.fetch(key, cpp_files[0])
+    if hit:
+        print("transpile: hit %s" % key[:12])
+    else:
+        print("transpile: miss %s" % key[:12])
+        ray_py = os.path.join(RAY_DIR, "ray.py")
+        run([sys.executable, ray_py] + transpileArgs(args), args.verbose,
+            quiet=True)
+        if split_dir:
+            cpp_files[:] = outputFiles(split_dir)
+        if args.format:
+            run(formatCommand(args) + cpp_files, args.verbose)
+        if split_dir:
+            store.storeTree(key, split_dir)
+        else:
+            store.store(key, cpp_files[0])
+    if split_dir:
+        cpp_files[:] = outputFiles(split_dir)
+
+
+def outputFiles(split_dir):
+    return sorted(glob.glob("%s/*.hpp" % split_dir) +
+                  glob.glob("%s/*.cpp" % split_dir))
+
+
+def compileObject(args, store, cpp_file, headers):
+    name = os.path.splitext(os.path.basename(cpp_file))[0]
+    object_file = "%s/objects/%s.o" % (args.build_dir, name)
+    command = objectCommand(args, cpp_file, object_file)
+    # NOTE: every unit includes the program or common header, which pulls
+    # in all other headers, so they are all part of the key.
+    key = compileKey([cpp_file] + headers, command)
+    if store.fetch(key, object_file):
+        print("compile %s: hit %s" % (name, key[:12]))
+    else:
+        print("compile %s: miss %s" % (name, key[:12]))
+        os.makedirs(os.path.dirname(object_file), exist_ok=True)
+        run(command, args.verbose)
+        store.store(key, object_file)
+    return object_file
+
+
+def compileObjects(args, store, cpp_files):
+    headers = [name for name in cpp_files if name.endswith(".hpp")]
+    units = [name for name in cpp_files if name.endswith(".cpp")]
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        return list(executor.map(
+            lambda cpp_file: compileObject(args, store, cpp_file, headers),
+            units))
+
+
+def build(args):
+    store = ContentStore(args.store)
+    cpp_files = ["%s/%s" % (args.build_dir, args.out)]
+    binary = "%s/output" % args.out_dir
+
+    transpile(args, store, cpp_files)
+
+    if not args.transpile_only:
+        sources = cpp_files
+        step = "compile"
+        if splitDir(args):
+            sources = compileObjects(args, store, cpp_files)
+            step = "link"
+        command = compileCommand(args, sources, binary)
+        key = compileKey(sources, command)
+        if store.fetch(key, binary):
+            print("%s: hit %s" % (step, key[:12]))
+        else:
+            print("%s: miss %s" % (step, key[:12]))
+            os.makedirs(args.out_dir, exist_ok=True)
+            run(command, args.verbose)
+            store.store(key, binary)
+    print("cache: %d hits, %d misses" % (store.hits, store.misses))
+
+    if args.run and not args.transpile_only:
+        return subprocess.call([binary])
+    return 0
+
+
+def parseArgs(argv=None):
+    cmd = argparse.ArgumentParser(prog="ray", description='Ray build driver')
+    commands = cmd.add_subparsers(dest='command')
+    commands.required = True
+    build_cmd = commands.add_parser('build', help='transpile and compile a'
+                                    ' ray program, reusing cached results')
+    build_cmd.add_argument('--src', dest='source', default="main.ray",
+                           help='ray source file', type=str)
+    build_cmd.add_argument('--prefix', dest='prefix', default="input",
+                           help='ray source dir', type=str)
+    build_cmd.add_argument('--include-dir', dest='include_dirs', default=[],
+                           action='append',
+                           help='extra directory searched for includes,'
+                                ' can be repeated', type=str)
+    build_cmd.add_argument('--out', dest='out', default="output.cpp",
+                           help='generated c++ file', type=str)
+    build_cmd.add_argument('--build-dir', dest='build_dir', default="build",
+                           help='ray build dir', type=str)
+    build_cmd.add_argument('--out-dir', dest='out_dir', default="output",
+                           help='binary output dir', type=str)
+    build_cmd.add_argument('--store', dest='store', default="build/cas",
+                           help='content addressed store for cached'
+                                ' outputs', type=str)
+    build_cmd.add_argument('--parser', dest='parser', default="lalr",
+                           help='parsing algorithm for ray sources', type=str)
+    build_cmd.add_argument('--no-parser-cache', dest='parser_cache',
+                           action='store_false',
+                           help='rebuild the grammars instead of loading'
+                                ' them from the build dir cache')
+    build_cmd.add_argument('--release', dest='release', action='store_true',
+                           default=os.environ.get("Release") == "true",
+                           help='use the optimized release flags instead of'
+                                ' the debug and sanitizer flags')
+    build_cmd.add_argument('--compiler', dest='compiler',
+                           default="clang++-6.0", help='c++ compiler',
+                           type=str)
+    build_cmd.add_argument('--extra-flags', dest='extra_flags',
+                           default=os.environ.get("extra_flags", ""),
+                           help='extra compiler flags', type=str)
+    build_cmd.add_argument('--clang-format', dest='clang_format',
+                           default="clang-format", help='clang-format binary',
+                           type=str)
+    build_cmd.add_argument('--format', dest='format', action='store_true',
+                           default=False,
+                           help='run clang-format over the generated c++,'
+                                ' it is already indented as written')
+    build_cmd.add_argument('--no-format', dest='format', action='store_false',
+                           help='skip clang-format on the generated c++,'
+                                ' the default')
+    split = build_cmd.add_mutually_exclusive_group()
+    split.add_argument('--split-modules', dest='split_modules',
+                       action='store_true',
+                       help='compile one translation unit per module in'
+                            ' parallel and link them')
+    split.add_argument('--shards', dest='shards', default=0,
+                       help='compile this many cost balanced translation'
+                            ' units in parallel and link them', type=int)
+    split.add_argument('--prune', dest='prune', action='store_true',
+                       help='compile a single translation unit without the'
+                            ' definitions main and the @@emit blocks never'
+                            ' reach')
+    build_cmd.add_argument('--jobs', dest='jobs', default=os.cpu_count(),
+                           help='parallel compiles with --split-modules or'
+                                ' --shards', type=int)
+    build_cmd.add_argument('--transpile-only', dest='transpile_only',
+                           action='store_true',
+                           help='stop after generating the c++ file')
+    build_cmd.add_argument('--run', dest='run', action='store_true',
+                           help='run the binary after building it')
+    build_cmd.add_argument('--verbose', dest='verbose', action='store_true',
+                           help='print the commands that are run')
+    build_cmd.add_argument('--ray-args', dest='ray_args',
+                           nargs=argparse.REMAINDER, default=[],
+                           help='extra arguments passed to ray.py')
+    return cmd.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+    return build(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import sys
+
+from array import array
+
+from ray_ast import NODE_TYPES, Node, Program
+
+# NOTE: every field is one unsigned slot, the low bits tag what the rest
+# of the slot holds.
+TAG_BITS = 2
+TAG_MASK = (1 << TAG_BITS) - 1
+CONSTANT = 0
+NODE = 1
+STRING = 2
+LIST = 3
+CONSTANTS = (None, False, True)
+
+
+class NodeView(Node):
+    # NOTE: stands in for a ray_ast node without holding its fields, they
+    # are decoded from the arrays on every access. Views are cheap, equal
+    # when they point at the same node and can be dropped at any time.
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def line(self):
+        return self.tree.lines[self.index]
+
+    def __eq__(self, other):
+        return (isinstance(other, NodeView) and other.tree is self.tree
+                and other.index == self.index)
+
+    def __hash__(self):
+        return hash(self.index)
+
+    def __reduce__(self):
+        # NOTE: a pickled view is its tree and index, the tree itself is
+        # only written once however many views point into it.
+        return self.tree.view, (self.index,)
+
+
+def fieldProperty(position):
+    def getter(self):
+        tree = self.tree
+        return tree.decode(tree.slots[tree.firsts[self.index] + position])
+    return property(getter)
+
+
+def viewType(node_type):
+    namespace = {"__slots__": (), "kind": node_type.kind,
+                 "fields": node_type.fields}
+    for position, field in enumerate(node_type.fields):
+        namespace[field] = fieldProperty(position)
+    return type("%sView" % node_type.__name__, (NodeView,), namespace)
+
+
+NODE_TYPE_LIST = sorted(NODE_TYPES.values(), key=lambda node_type:
+                        node_type.__name__)
+NODE_TYPE_IDS = {node_type: type_id
+                 for type_id, node_type in enumerate(NODE_TYPE_LIST)}
+VIEW_TYPES = [viewType(node_type) for node_type in NODE_TYPE_LIST]
+
+
+class CompactTree(object):
+    # NOTE: struct of arrays storage for lowered programs. Node i has its
+    # type in kinds[i], its line in lines[i] and its fields in the slots
+    # starting at firsts[i]. A list is a length slot followed by its items.
+    # Names and strings live once in the strings table.
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.lines = array('I')
+        self.firsts = array('I')
+        self.slots = array('I')
+        self.strings = []
+        self.string_ids = {}
+
+    def packProgram(self, program):
+        # NOTE: the program node stays a plain object, its statements are
+        # views, so trees spliced per file join up without repacking.
+        return Program(program.line, [self.view(self.pack(node))
+                                      for node in program.statements])
+
+    def packing(self, parse):
+        # NOTE: wraps a per file parse, each file is packed as soon as it is
+        # parsed so only one file worth of node objects is alive at a time.
+        return lambda *args: self.packProgram(parse(*args))
+
+    def pack(self, node):
+        if isinstance(node, NodeView) and node.tree is self:
+            return node.index
+        values = [self.encode(getattr(node, field), node, field)
+                  for field in node.fields]
+        index = len(self.kinds)
+        self.kinds.append(NODE_TYPE_IDS[type(node)])
+        self.lines.append(node.line)
+        self.firsts.append(len(self.slots))
+        self.slots.extend(values)
+        return index
+
+    def encode(self, value, node, field):
+        if isinstance(value, Node):
+            return self.pack(value) << TAG_BITS | NODE
+        if isinstance(value, str):
+            return self.stringId(value) << TAG_BITS | STRING
+        if isinstance(value, list):
+            items = [self.encode(item, node, field) for item in value]
+            offset = len(self.slots)
+            self.slots.append(len(items))
+            self.slots.extend(items)
+            return offset << TAG_BITS | LIST
+        # NOTE: matched on identity, 0 and 1 compare equal to False and True
+        # and would come back as them.
+        for constant_id, constant in enumerate(CONSTANTS):
+            if value is constant:
+                return constant_id << TAG_BITS | CONSTANT
+        raise TypeError("compact ir can not store %r in %s.%s" % (
+            value, node.kind, field))
+
+    def stringId(self, value):
+        string_id = self.string_ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(sys.intern(value))
+            self.string_ids[value] = string_id
+        return string_id
+
+    def decode(self, slot):
+        tag = slot & TAG_MASK
+        payload = slot >> TAG_BITS
+        if tag == NODE:
+            return self.view(payload)
+        if tag == STRING:
+            return self.strings[payload]
+        if tag == LIST:
+            count = self.slots[payload]
+            return [self.decode(item) for item in
+                    self.slots[payload + 1:payload + 1 + count]]
+        return CONSTANTS[payload]
+
+    def view(self, index):
+        return VIEW_TYPES[self.kinds[index]](self, index)
+
+    def nodeCount(self):
+        return len(self.kinds)
+
+    def nbytes(self):
+        size = sum(len(buffer) * buffer.itemsize for buffer in (
+            self.kinds, self.lines, self.firsts, self.slots))
+        return size + sum(sys.getsizeof(string) for string in self.strings)
@@ -0,0 +1,242 @@
+import os
+
+from ray_ast import iterNodes
+
+RUNTIME_HEADER = "__runtime__.hpp"
+RUNTIME_SOURCE = "__runtime__.cpp"
+PROGRAM_HEADER = "__program__.hpp"
+COMMON_HEADER = "__common__.hpp"
+
+PRELUDE_NODES = ("emit_statement", "comment")
+HEADER_NODES = ("import_statement", "from_statement", "class_define",
+                "class_declaration", "function_declaration", "extern_type",
+                "extern_func")
+# NOTE: rough compile cost of a syntax tree node relative to one emitted byte.
+NODE_COST = 8
+
+
+class ModuleSplitter(object):
+
+    def __init__(self, transpiler, symbol_builder, **kwargs):
+        self.transpiler = transpiler
+        self.symbol_builder = symbol_builder
+
+    def processTree(self, tree, out_dir):
+        files = self.splitTree(tree)
+        os.makedirs(out_dir, exist_ok=True)
+        for filename in os.listdir(out_dir):
+            if filename.endswith((".hpp", ".cpp")) and filename not in files:
+                os.remove(os.path.join(out_dir, filename))
+        written = []
+        for filename, text in files.items():
+            if self.writeIfChanged(os.path.join(out_dir, filename), text):
+                written.append(filename)
+        return files, written
+
+    def splitTree(self, tree):
+        prelude, program, modules = self.partition(tree)
+        files = {RUNTIME_HEADER: self.header(self.decodeNodes(prelude))}
+        for name, module_nodes in modules.items():
+            scope = self.symbol_builder.global_scope.scopes[name]
+            files["%s.hpp" % name] = self.header(
+                self.declareModule(name, module_nodes))
+            files["%s.cpp" % name] = self.source(self.wrapNamespace(
+                name, self.defineScope(scope, module_nodes)))
+        files[PROGRAM_HEADER] = self.header(
+            ['#include "%s"' % RUNTIME_HEADER] +
+            self.declareProgram(program, modules))
+        files[RUNTIME_SOURCE] = self.source(self.defineNodes(
+            self.symbol_builder.global_scope,
+            [node for node in program if node.kind != "module_statement"]))
+        return files
+
+    def partition(self, tree):
+        # NOTE: the leading emit blocks are the runtime prelude every
+        # translation unit needs, everything after it is split by module.
+        prelude = []
+        program = []
+        modules = {}
+        for node in self.subNodes(tree):
+            if node.kind == "module_statement":
+                name = self.moduleName(node)
+                if name not in modules:
+                    program.append(node)
+                modules.setdefault(name, []).append(node)
+            elif not program and node.kind in PRELUDE_NODES:
+                prelude.append(node)
+            else:
+                program.append(node)
+        return prelude, program, modules
+
+    def declareProgram(self, program, modules, inline_modules=False):
+        lines = []
+        for node in program:
+            if node.kind == "module_statement":
+                name = self.moduleName(node)
+                if inline_modules:
+                    lines += self.declareModule(name, modules[name])
+                else:
+                    lines.append('#include "%s.hpp"' % name)
+            elif node.kind in HEADER_NODES:
+                lines.append(self.declareNode(node))
+        return lines + self.declareSymbols(self.symbol_builder.global_scope)
+
+    def declareModule(self, name, module_nodes):
+        scope = self.symbol_builder.global_scope.scopes[name]
+        return self.wrapNamespace(name, self.declareScope(scope, module_nodes))
+
+    def declareScope(self, scope, module_nodes):
+        lines = []
+        for module_node in module_nodes:
+            for node in self.subNodes(module_node.block):
+                if node.kind == "module_statement":
+                    name = self.moduleName(node)
+                    lines += self.wrapNamespace(name, self.declareScope(
+                        scope.scopes[name], [node]))
+                elif node.kind in HEADER_NODES:
+                    lines.append(self.declareNode(node))
+        return lines + self.declareSymbols(scope)
+
+    def declareSymbols(self, scope):
+        lines = []
+        for sym in scope.symbols.values():
+            # NOTE: only declare the symbols defined here.
+            if sym.qualified_name != self.qualifiedName(scope, sym.name):
+                continue
+            if sym.category == "function":
+                lines.append(self.transpiler.render(
+                    sym.node, self.transpiler.decodeFunctionDecl))
+            elif sym.category == "var":
+                lines.append(self.transpiler.render(
+                    sym.node, self.transpiler.decodeExternVar))
+        return lines
+
+    def declareNode(self, node):
+        cpp = self.decodeNode(node)
+        if node.kind == "from_statement" and not node.is_type:
+            # NOTE: function aliases are variables, a header copy in every
+            # translation unit has to be inline.
+            cpp = "inline %s" % cpp
+        return cpp
+
+    def defineScope(self, scope, module_nodes):
+        lines = []
+        for module_node in module_nodes:
+            lines += self.defineNodes(
+                scope, self.subNodes(module_node.block))
+        return lines
+
+    def defineNodes(self, scope, nodes):
+        lines = []
+        for node in nodes:
+            if node.kind == "module_statement":
+                name = self.moduleName(node)
+                lines += self.wrapNamespace(name, self.defineScope(
+                    scope.scopes[name], [node]))
+            elif node.kind not in HEADER_NODES:
+                lines.append(self.decodeNode(node))
+        return lines
+
+    def decodeNode(self, node):
+        transpiler = self.transpiler
+        cpp = transpiler.render(node)
+        return transpiler.lineDirective(node) + cpp if cpp else cpp
+
+    def decodeNodes(self, nodes):
+        return [self.decodeNode(node) for node in nodes]
+
+    def subNodes(self, tree):
+        return tree.statements
+
+    def moduleName(self, node):
+        return node.name
+
+    def qualifiedName(self, scope, name):
+        if scope.qualified_name:
+            return "%s.%s" % (scope.qualified_name, name)
+        return name
+
+    def wrapNamespace(self, name, lines):
+        return (["namespace %s {" % name] + lines +
+                ["} // namespace %s" % name])
+
+    def header(self, lines):
+        return "\n".join(["#pragma once"] +
+                         [line for line in lines if line]) + "\n"
+
+    def source(self, lines, header=PROGRAM_HEADER):
+        return "\n".join(['#include "%s"' % header] +
+                         [line for line in lines if line]) + "\n"
+
+    def writeIfChanged(self, filename, text):
+        # NOTE: untouched files keep their mtime so make style builds only
+        # recompile the translation units that changed.
+        if os.path.exists(filename):
+            with open(filename) as current:
+                if current.read() == text:
+                    return False
+        with open(filename, "w") as out:
+            out.write(text)
+        return True
+
+
+class ShardSplitter(ModuleSplitter):
+
+    def __init__(self, transpiler, symbol_builder, shards=2, **kwargs):
+        super(ShardSplitter, self).__init__(transpiler, symbol_builder,
+                                            **kwargs)
+        self.shards = shards
+        self.loads = []
+
+    def splitTree(self, tree):
+        prelude, program, modules = self.partition(tree)
+        files = {COMMON_HEADER: self.header(
+            self.decodeNodes(prelude) +
+            self.declareProgram(program, modules, inline_modules=True))}
+        units = self.definitionUnits(program, modules)
+        for index, shard in enumerate(self.balance(units)):
+            files["shard%s.cpp" % index] = self.source(
+                [text for _, text in shard], header=COMMON_HEADER)
+        return files
+
+    def definitionUnits(self, program, modules):
+        units = []
+        for node in program:
+            if node.kind == "module_statement":
+                name = self.moduleName(node)
+                for module_node in modules[name]:
+                    units += self.moduleUnits(module_node, [name])
+            elif node.kind not in HEADER_NODES:
+                units.append(self.unit(node, []))
+        return [unit for unit in units if unit[1]]
+
+    def moduleUnits(self, module_node, namespaces):
+        units = []
+        for node in self.subNodes(module_node.block):
+            if node.kind == "module_statement":
+                units += self.moduleUnits(
+                    node, namespaces + [self.moduleName(node)])
+            elif node.kind not in HEADER_NODES:
+                units.append(self.unit(node, namespaces))
+        return units
+
+    def unit(self, node, namespaces):
+        cpp = self.decodeNode(node)
+        if not cpp:
+            return 0, cpp
+        lines = [cpp]
+        for name in reversed(namespaces):
+            lines = self.wrapNamespace(name, lines)
+        text = "\n".join(lines)
+        return len(text) + NODE_COST * sum(1 for _ in iterNodes(node)), text
+
+    def balance(self, units):
+        # NOTE: largest units first onto the least loaded shard, each shard
+        # keeps the source order of its units.
+        shards = [[] for _ in range(self.shards)]
+        self.loads = [0] * self.shards
+        for index in sorted(range(len(units)), key=lambda i: -units[i][0]):
+            shard = self.loads.index(min(self.loads))
+            shards[shard].append(index)
+            self.loads[shard] += units[index][0]
+        return [[units[index] for index in sorted(shard)] for shard in shards]
@@ -1,506 +1,478 @@
 import copy
 import decimal
+import json
 import sys
 
-from functools import partial
-
-from lark.lexer import Token
-
-class RayToCpp(object):
-
-    def __init__(self, prefix, **kwargs):
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+from ray_ast import Program
+from visitor import Visitor
+
+# NOTE: emitted text piles up as a list of pieces and goes to the output in
+# one write once there are this many, so huge modules are never held whole.
+FLUSH_PIECES = 4096
+# NOTE: matches .clang-format, LLVM style with four column indents and
+# namespace bodies left unindented.
+INDENT = "    "
+SILENT_NODES = ("extern_type", "extern_func")
+# NOTE: --jobs splits the top level statements into this many batches per
+# worker, enough to even out modules of different sizes.
+BATCHES_PER_JOB = 4
+
+
+def initCodegenWorker(prefix, source_map, statements, pruned):
+    # NOTE: a forked worker inherits the tree instead of unpickling it, so
+    # batches are sent as ranges of top level statements.
+    global worker_transpiler, worker_statements
+    worker_transpiler = RayToCpp(prefix, source_map=source_map,
+                                 pruned=pruned)
+    worker_statements = statements
+
+
+def renderBatch(start, stop):
+    out = StringIO()
+    worker_transpiler.processTree(
+        Program(1, worker_statements[start:stop]), out)
+    return out.getvalue()
+
+class RayToCpp(Visitor):
+    handlers = {
+        "runtime_value": "decodeRuntimeVal",
+        "scalar_declaration": "decodeScalareDeclare",
+        "scalar_define": "decodeScalarDef",
+        "aggregate_define": "decodeAggregateDef",
+        "aggregate_declaration": "decodeAggregateDeclare",
+        "class_define": "decodeClassDef",
+        "class_declaration": "decodeClassDecl",
+        "extern_type": "decodeExternType",
+        "extern_func": "decodeExternFunc",
+        "function_define": "decodeFunctionDef",
+        "function_declaration": "decodeFunctionDecl",
+        "operator_define": "decodeOperator",
+        "construct_expression": "decodeConstruct",
+        "prefix_expression": "decodePrefix",
+        "postfix_expression": "decodePostfix",
+        "call_expression": "decodeCall",
+        "bin_expression": "decodeBinExpression",
+        "emit_statement": "decodeEmitStatement",
+        "assignment_statement": "decodeAssignment",
+        "module_statement": "decodeModule",
+        "import_statement": "decodeImport",
+        "from_statement": "decodeFrom",
+        "block_statement": "decodeBlock",
+        "block": "decodeBlock",
+        "return_statement": "decodeReturn",
+        "expression_statement": "decodeExpression",
+        "while_statement": "decodeWhile",
+        "if_statement": "decodeIf",
+        "elif_statement": "decodeElif",
+        "else_statement": "decodeElse",
+        "condtional_statement": "decodeCondtional",
+        "constant_name": "decodeConstant",
+        "scalar_type_name": "decodeScalarTypeName",
+        "aggregate_type_name": "decodeAggregateTypeName",
+        "pointer_type_name": "decodePointerTypeName",
+        "comment": "decodeComment",
+        "string": "decodeString",
+        "DEC_NUMBER": "decodeDecNumber",
+        "OCT_NUMBER": "decodeOctNumber",
+        "BIN_NUMBER": "decodeBinNumber",
+        "HEX_NUMBER": "decodeHexNumber",
+        "FLOAT_NUMBER": "decodeFloat",
+        "FIXED_POINT_NUMBER": "decodeFixed",
+    }
+    default_handler = "decodeRaw"
+
+    def __init__(self, prefix, source_map=None, pruned=frozenset(),
+                 **kwargs):
         self.prefix = prefix
+        self.source_map = source_map
+        self.pruned = pruned
         self.targetLang = "cpp"
-        self.nodeDecoders = {
-            "literal_value": self.decodeLiteral,
-            "runtime_value": self.decodeRuntimeVal,
-            "variable_declaration": self.decodeVarDeclare,
-            "scalar_declaration": self.decodeScalareDeclare,
-            "variable_define": self.decodeVarDef,
-            "scalar_define": self.decodeScalarDef,
-            "aggregate_define": self.decodeAggregateDef,
-            "aggregate_declaration": self.decodeAggregateDeclare,
-            "class_define": self.decodeClassDef,
-            "class_declaration": self.decodeClassDecl,
-            "extern_type": self.decodeExternType,
-            "extern_func": self.decodeExternFunc,
-            "template_class_define": self.decodeTemplateClassDef,
-            "function_define": self.decodeFunctionDef,
-            "operator_define": self.decodeOperator,
-            "construct_expression": self.decodeConstruct,
-            'prefix_expression': self.decodePrefix,
-            'postfix_expression': self.decodePostfix,
-            "subscript": self.decodeSubscript,
-            "call_expression": self.decodeCall,
-            "bin_expression": self.decodeBinExpression,
-            "emit_statement": self.decodeEmitStatement,
-            "assignment_statement": self.decodeAssignment,
-            "module_statement": self.decodeModule,
-            "import_statement": self.decodeImport,
-            "from_statement": self.decodeFrom,
-            "block_statement": self.decodeBlock,
-            "block": self.decodeBlock,
-            "escaped_block": self.decodeEscapedBlock,
-            "return_statement": self.decodeReturn,
-            "expression_statement": self.decodeExpression,
-            "while_statement": self.decodeWhile,
-            "if_statement": self.decodeIf,
-            "elif_statement": self.decodeElif,
-            "else_statement": self.decodeElse,
-            "condtional_statement": self.decodeCondtional,
-            "name": self.decodeName,
-            "constant_name": self.decodeConstant,
-            "scalar_type_name": self.decodeScalarTypeName,
-            "aggregate_type_name": self.decodeAggregateTypeName,
-            "pointer_type_name": self.decodePointerTypeName,
-            "comment": self.decodeComment,
-            "number": self.decodeNumber,
-            "token": self.decodeToken,
-            "string": self.decodeString,
-            "DEC_NUMBER": self.decodeDecNumber,
-            "OCT_NUMBER": self.decodeOctNumber,
-            "BIN_NUMBER": self.decodeBinNumber,
-            "HEX_NUMBER": self.decodeHexNumber,
-            "FLOAT_NUMBER": self.decodeFloat,
-            "FIXED_POINT_NUMBER": self.decodeFixed
-        }
-
-    def processTree(self, tree, out=sys.stdout):
-        for node in tree.children:
-            self.processNode(node, out)
+        self.out = None
+        self.indent = ""
+        self.pieces = []
+        self.write = self.pieces.append
+
+    def processTree(self, tree, out=sys.stdout, jobs=1):
+        if jobs > 1:
+            self.processTreeParallel(tree, out, jobs)
+            return
+        self.out = out
+        for node in tree.statements:
+            if self.isSilent(node):
+                continue
+            self.decodeStatement(node)
+            self.write("\n")
+            if len(self.pieces) >= FLUSH_PIECES:
+                self.flush()
+        self.flush()
+
+    def processTreeParallel(self, tree, out, jobs):
+        # NOTE: top level statements turn into c++ independently of each
+        # other. Contiguous batches are rendered by a process pool and
+        # written in source order, with only a couple of batches per worker
+        # in flight so finished text does not pile up.
+        statements = tree.statements
+        size = max(1, -(-len(statements) // (jobs * BATCHES_PER_JOB)))
+        pending = deque()
+        initargs = (self.prefix, self.source_map, statements, self.pruned)
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 initializer=initCodegenWorker,
+                                 initargs=initargs) as executor:
+            for start in range(0, len(statements), size):
+                pending.append(executor.submit(renderBatch, start,
+                                               start + size))
+                if len(pending) > 2 * jobs:
+                    out.write(pending.popleft().result())
+            while pending:
+                out.write(pending.popleft().result())
 
     def processNode(self, node, out=sys.stdout):
-        print(self.consume(self.getDecoder(node)(node)),file=out)
+        self.out = out
+        self.decodeStatement(node)
+        self.write("\n")
+        self.flush()
+
+    def flush(self):
+        if self.pieces:
+            self.out.write("".join(self.pieces))
+            self.pieces.clear()
+
+    def render(self, node, decode=None):
+        # NOTE: returns the c++ for one node as a string instead of sending
+        # it to the output, for callers that lay out files themselves.
+        saved = self.out, self.pieces, self.write
+        self.out = StringIO()
+        self.pieces = []
+        self.write = self.pieces.append
+        try:
+            (decode or self.decodeNode)(node)
+            self.flush()
+            return self.out.getvalue()
+        finally:
+            self.out, self.pieces, self.write = saved
+
+    def decodeStatement(self, node):
+        # NOTE: starts on a fresh line, directives stay in the first column
+        # like clang-format leaves them.
+        if self.source_map is not None:
+            self.write(self.lineDirective(node))
+        if self.indent:
+            self.write(self.indent)
+        self.decodeNode(node)
+
+    def isSilent(self, node):
+        # NOTE: statements that emit no c++, skipped so they do not leave
+        # blank lines behind. Pruned definitions are dropped the same way.
+        if node in self.pruned:
+            return True
+        if node.kind == "emit_statement":
+            return node.language != self.targetLang
+        return node.kind in SILENT_NODES
+
+    def lineDirective(self, node):
+        # NOTE: points compiler diagnostics, debuggers and profilers at the
+        # ray source instead of the generated c++.
+        if self.source_map is None:
+            return ""
+        location = self.source_map.lookup(node.line)
+        if location is None:
+            return ""
+        filename, line = location
+        return "#line %s %s\n" % (
+            line, json.dumps(self.source_map.displayName(filename)))
 
     def decodeEmitStatement(self, node):
-        raw = node.children
-        if raw[1].children[0].value == self.targetLang:
-            sub_node = raw[3]
-            current = self.getDecoder(sub_node)(sub_node)
-            data = []
-            data += self.consume(current)
-            data += "\n"
-            yield "".join(data[:-1])
-        else:
-            yield ""
-
-    def decodeEscapedBlock(self,node):
-        yield node.children[0].value[3:-3]
-
-    def decodeSubscript(self,node):
-        raw = node.children[1]
-        yield "[%s]" % self.consume(self.getDecoder(raw)(raw))
+        if node.language == self.targetLang:
+            self.write(node.code)
 
     def decodePostfix(self,node):
-        raw = node.children
-        data = []
-        for sub_node in raw:
-            current = self.getDecoder(sub_node)(sub_node)
-            data += self.consume(current)
-        yield "".join(data)
+        self.decodeNode(node.value)
+        self.write("[")
+        self.decodeNode(node.index)
+        self.write("]")
 
     def decodePrefix(self,node):
-        raw = node.children
-        data = []
-        for sub_node in raw:
-            current = self.getDecoder(sub_node)(sub_node)
-            data += self.consume(current)
-        yield "".join(data)
+        self.write(node.op)
+        self.decodeNode(node.value)
 
     def decodeBlock(self, node):
-        raw = node.children
-        data = []
-        for sub_node in raw:
-            current = self.getDecoder(sub_node)(sub_node)
-            data += self.consume(current)
-            data += "\n"
-        yield "".join(data[:-1])
-
-    def decodeCondtional(self, node, out=sys.stdout):
-        raw = node.children
-        data = []
-        for sub_node in raw:
-            current = self.getDecoder(sub_node)(sub_node)
-            data += self.consume(current)
-            data += "\n"
-        yield "".join(data[:-1])
+        self.decodeBody(node, self.indent + INDENT)
+
+    def decodeBody(self, node, indent):
+        write = self.write
+        statements = [sub_node for sub_node in node.statements
+                      if not self.isSilent(sub_node)]
+        if not statements:
+            write("{}")
+            return
+        outer = self.indent
+        self.indent = indent
+        write("{")
+        for sub_node in statements:
+            write("\n")
+            self.decodeStatement(sub_node)
+            if len(self.pieces) >= FLUSH_PIECES:
+                self.flush()
+        self.indent = outer
+        write("\n%s}" % outer)
+
+    def decodeCondtional(self, node):
+        self.decodeNode(node.if_statement)
+        for sub_node in node.elifs:
+            self.write(" ")
+            self.decodeNode(sub_node)
+        if node.else_statement is not None:
+            self.write(" ")
+            self.decodeNode(node.else_statement)
 
     def decodeIf(self, node):
-        raw = node.children
-        cpp = "if(%(condition)s)%(body)s"
-        condition = self.consume(self.getDecoder(raw[1])(raw[1]))
-        body = self.consume(self.getDecoder(raw[3])(raw[3]))
-        yield cpp % {"condition": condition, "body": body}
-
+        self.write("if (")
+        self.decodeNode(node.predicate)
+        self.write(") ")
+        self.decodeBlock(node.block)
 
     def decodeElif(self, node):
-        raw = node.children
-        cpp = "else if(%(condition)s)%(body)s"
-        condition = self.consume(self.getDecoder(raw[1])(raw[1]))
-        body = self.consume(self.getDecoder(raw[3])(raw[3]))
-        yield cpp % {"condition": condition, "body": body}
+        self.write("else if (")
+        self.decodeNode(node.predicate)
+        self.write(") ")
+        self.decodeBlock(node.block)
 
     def decodeElse(self, node):
-        raw = node.children
-        cpp = "else %(body)s"
-        body = self.consume(self.getDecoder(raw[0])(raw[0]))
-        yield cpp % {"body": body}
+        self.write("else ")
+        self.decodeBlock(node.block)
 
     def decodeComment(self, node):
-        val = self.decodeToken(node.children[0])
-        yield self.consume(val).replace('#', '//', 1)
+        self.write(node.text.replace('#', '//', 1))
 
     def decodeFunctionDef(self, node):
-        # return "function def"
-        child_nodes = node.children
-        params = {
-            "type": self.consume(self.getDecoder(child_nodes[0])(child_nodes[0])),
-            "name": self.consume(self.decodeName(child_nodes[1])),
-            "args": "",
-            "block": self.consume(self.decodeBlock(child_nodes[-1])),
-        }
-        if len(child_nodes) == 6:
-            params["args"] = self.consume(self.decodeParams(child_nodes[3]))
-        if params["name"] == "main":
-            params["name"] = "__main__"
-        cpp = "%(type)s %(name)s( %(args)s )%(block)s"
-        yield cpp % params
+        self.decodeSignature(node)
+        self.write(") ")
+        self.decodeBlock(node.block)
+
+    def decodeFunctionDecl(self, node):
+        # NOTE: also used to forward declare function_define nodes, both
+        # keep the same signature fields.
+        self.decodeSignature(node)
+        self.write(");")
+
+    def decodeSignature(self, node):
+        name = node.name
+        if name == "main":
+            name = "__main__"
+        self.decodeNode(node.return_type)
+        self.write(" %s(" % name)
+        self.decodeParams(node.params)
 
     def decodeOperator(self, node):
-        # return "function def"
-        child_nodes = node.children
-        params = {
-            "type": self.consume(self.getDecoder(child_nodes[0])(child_nodes[0])),
-            "args": "",
-            "block": self.consume(self.decodeBlock(child_nodes[-1])),
-        }
-        if len(child_nodes) == 5:
-            params["args"] = self.consume(self.decodeParams(child_nodes[3]))
-
-        cpp = "operator %(type)s( %(args)s )%(block)s"
-        yield cpp % params
+        self.write("operator %s(" % node.name)
+        self.decodeParams(node.params)
+        self.write(") ")
+        self.decodeBlock(node.block)
 
     def decodeClassDef(self, node):
-        child_nodes = node.children
-        params = {
-            "type": self.consume(self.decodeScalarTypeName(child_nodes[0])),
-            "block": self.consume(self.decodeBlock(child_nodes[-1])),
-            "parent": ""
-        }
-        if len(child_nodes) == 4:
-            params["parent"] = ': public ' + self.consume(self.decodeParams(child_nodes[2]))
-
-        cpp = "struct %(type)s %(parent)s %(block)s;"
-        yield (cpp % params).replace('\n;',';')
+        write = self.write
+        write("struct ")
+        self.decodeScalarTypeName(node.type_name)
+        write(" ")
+        if node.parent is not None:
+            write(": public ")
+            self.decodeNode(node.parent)
+            write(" ")
+        self.decodeBlock(node.block)
+        write(";")
     
     def decodeClassDecl(self, node):
-        child_nodes = node.children
-        params = {
-            "type": self.consume(self.decodeScalarTypeName(child_nodes[0])),
-            "parent": ""
-        }
-        if len(child_nodes) == 4:
-            params["parent"] = ': public ' + self.consume(self.decodeParams(child_nodes[2]))
-
-        cpp = "struct %(type)s %(parent)s;"
-        yield (cpp % params).replace('\n;',';')
+        self.write("struct ")
+        self.decodeScalarTypeName(node.type_name)
+        self.write(";")
         
     def decodeExternType(self, node):
-        yield ""    
+        pass
         # TODO emit comment containing external type    
 
     def decodeExternFunc(self, node):
-        yield ""
+        pass
         # TODO emit comment containing external fuction
 
-    def decodeTemplateClassDef(self, node):
-        child_nodes = node.children
-        template_args = node.children[1:-1]
-        params = {
-            "type": self.consume(self.decodeScalarTypeName(child_nodes[0])),
-            "block": self.consume(self.decodeBlock(child_nodes[-1])),
-            "parent": ""
-        }
-        if len(child_nodes) == 4:
-            params["parent"] = ': public ' + self.consume(self.decodeParams(child_nodes[2]))
-
-        cpp = "struct %(type)s %(parent)s %(block)s;"
-        yield (cpp % params).replace('\n;',';')
-
     def decodeBinExpression(self, node):
-        lhs = node.children[0]
-        operator = node.children[1]
-        rhs = node.children[2]
-        params = {
-            "lhs": self.consume(self.getDecoder(lhs)(lhs)),
-            "operator": self.consume(self.getDecoder(operator)(operator)),
-            "rhs": self.consume(self.getDecoder(rhs)(rhs))
-        }
-        cpp = "%(lhs)s %(operator)s %(rhs)s"
-        yield (cpp % params)
-
-
-    def decodeArgs(self, node):
-        child_nodes = node.children
-        data = []
-        for sub_node in child_nodes:
-            tmp = self.consume(self.getDecoder(sub_node)(sub_node))
-            if not isinstance(sub_node, Token) and sub_node.data == "string":
-                tmp = "'%s'" % tmp
-            data += '%s ' % tmp
-        args = "".join(data)
-        yield args.replace(' ,', ',').replace('  )', ')')
-
-    def decodeParams(self, node):
-        child_nodes = node.children
-        data = []
-        for sub_node in child_nodes:
-            data += self.consume(self.getDecoder(sub_node)(sub_node))
-            data += ' '
-        yield "".join(data).replace(':', '').replace(' ,', ',')
+        self.decodeNode(node.lhs)
+        self.write(" %s " % node.op)
+        self.decodeNode(node.rhs)
+
+    def decodeArgs(self, args):
+        write = self.write
+        for index, arg in enumerate(args):
+            if index:
+                write(", ")
+            if arg.name is not None:
+                write("%s := " % arg.name)
+            self.decodeNode(arg.value)
+
+    def decodeParams(self, params):
+        write = self.write
+        for index, param in enumerate(params):
+            if index:
+                write(", ")
+            self.decodeNode(param.type_name)
+            write(" %s" % param.name)
+            if param.default is not None:
+                write(" = ")
+                self.decodeNode(param.default)
 
     def decodeExpression(self, node):
-        # yield "expression"
-        child_nodes = node.children
-        data = []
-        for sub_node in child_nodes:
-            data += self.getDecoder(sub_node)(sub_node)
-        yield "".join(data)
+        self.decodeNode(node.expression)
+        self.write(";")
 
     def decodeReturn(self, node):
-        raw = node.children[0]
-        name = self.consume(self.getDecoder(raw)(raw))
-        yield "return %s;" % name
+        self.write("return ")
+        self.decodeNode(node.value)
+        self.write(";")
 
     def decodeCall(self, node):
-        child_nodes = node.children
-        params = {
-            "name": self.consume(self.decodeName(child_nodes[0])),
-            "args": ""
-        }
-        if len(child_nodes) > 3:
-            args = self.consume(self.decodeArgs(child_nodes[2]))
-            params["args"] = args
-        cpp = "%(name)s(%(args)s)"
-        yield cpp % params
+        self.write("%s(" % node.name)
+        self.decodeArgs(node.args)
+        self.write(")")
 
     def decodeConstruct(self, node):
-        child_nodes = node.children
-        params = {}
-        cpp = ""
-        if not isinstance(child_nodes[0],Token):
-            params = {
-                "name": self.consume(self.decodeName(child_nodes[0])),
-                "args": ""
-            }
-            if len(child_nodes) > 3:
-                args = self.consume(self.decodeArgs(child_nodes[2]))
-                params["args"] = args
-            cpp = "%(name)s(%(args)s)"
+        if node.type_name is not None:
+            self.write("%s(" % node.type_name)
+            self.decodeArgs(node.args)
+            self.write(")")
         else:
-            params = self.consume(self.decodeArgs(child_nodes[1]))
-            cpp = "{%s}"
-        yield cpp % params
-
-
-    def consume(self, val):
-        ret = val
-        from types import GeneratorType as generator
-        while(isinstance(ret, generator)):
-            ret = next(ret)
-        return ret
+            self.write("{")
+            self.decodeArgs(node.args)
+            self.write("}")
 
     def decodeWhile(self, node):
-        child_nodes = node.children
-        params = {
-            "condition": self.consume(self.getDecoder(child_nodes[1])(child_nodes[1])),
-            "block": self.consume(self.getDecoder(child_nodes[3])(child_nodes[3])),
-        }
-        cpp = "while(%(condition)s)%(block)s;"
-        yield cpp % params
+        self.write("while (")
+        self.decodeNode(node.predicate)
+        self.write(") ")
+        self.decodeBlock(node.block)
 
     def decodeAssignment(self, node):
-        child_nodes = node.children
-
-        params = {
-            "name":  self.consume(self.getDecoder(child_nodes[0])(child_nodes[0])),
-            "offset":"[" +  self.consume(self.getDecoder(child_nodes[2])(child_nodes[2])) + "]",
-            "rval": self.consume(self.getDecoder(child_nodes[5])(child_nodes[5])),
-        } if len(child_nodes) == 7 else {
-            "name":  self.consume(self.getDecoder(child_nodes[0])(child_nodes[0])),
-            "offset": "",
-            "rval": self.consume(self.getDecoder(child_nodes[2])(child_nodes[2])),
-        }
-        cpp = "%(name)s%(offset)s = %(rval)s;"
-        yield cpp % params
-
-    def decodeVarDeclare(self, node):
-        raw = node.children[0]
-        yield self.getDecoder(raw)(raw)
+        write = self.write
+        write(node.name)
+        if node.offset is not None:
+            write("[")
+            self.decodeNode(node.offset)
+            write("]")
+        write(" = ")
+        self.decodeNode(node.value)
+        write(";")
 
     def decodeAggregateDeclare(self, node):
-        child_nodes = node.children
-        params = {
-            "type": self.consume(self.decodeScalarTypeName(child_nodes[0])),
-            "size": self.consume(self.decodeRVal(child_nodes[2])),
-            "name": self.consume(self.decodeName(child_nodes[4])),
-        }
-        cpp = "std::vector<%(type)s> %(name)s(%(size)s);"
-        yield cpp % params
+        self.write("std::vector<")
+        self.decodeScalarTypeName(node.type_name)
+        self.write("> %s(" % node.name)
+        self.decodeRVal(node.size)
+        self.write(");")
 
     def decodeScalareDeclare(self, node):
-        child_nodes = node.children
-        params = {
-            "type": self.consume(self.decodeScalarTypeName(child_nodes[0])),
-            "name": self.consume(self.decodeName(child_nodes[1])),
-        }
-        cpp = "%(type)s %(name)s;"
-        yield cpp % params
-
-    def decodeVarDef(self,node):
-        raw = node.children[0]
-        yield self.getDecoder(raw)(raw)
+        self.decodeScalarTypeName(node.type_name)
+        self.write(" %s;" % node.name)
+
+    def decodeExternVar(self, node):
+        write = self.write
+        write("extern ")
+        if node.kind.startswith("aggregate"):
+            write("std::vector<")
+            self.decodeScalarTypeName(node.type_name)
+            write(">")
+        else:
+            self.decodeNode(node.type_name)
+        write(" %s;" % node.name)
 
     def decodeAggregateDef(self, node):
-        child_nodes = node.children
-        params = {
-            "type": self.consume(self.decodeScalarTypeName(child_nodes[0])),
-            "name": self.consume(self.decodeName(child_nodes[1])),
-            "val": self.consume(self.decodeRVal(child_nodes[3])),
-        }
-        cpp = "std::array<%(type)s,%(size)s> %(name)s = %(val)s ;"
-        yield cpp % params
+        write = self.write
+        write("std::array<")
+        self.decodeScalarTypeName(node.type_name)
+        write(", ")
+        self.decodeRVal(node.size)
+        write("> %s = " % node.name)
+        self.decodeRVal(node.value)
+        write(";")
 
     def decodeScalarDef(self, node):
-        child_nodes = node.children
-        params = {
-            "type": self.consume(self.decodeScalarTypeName(child_nodes[0])),
-            "name": self.consume(self.decodeName(child_nodes[1])),
-            "val": self.consume(self.decodeRVal(child_nodes[3])),
-        }
-        cpp = "%(type)s %(name)s = %(val)s ;"
-        yield cpp % params
+        self.decodeScalarTypeName(node.type_name)
+        self.write(" %s = " % node.name)
+        self.decodeRVal(node.value)
+        self.write(";")
 
     def decodeRaw(self, node):
-        yield str(node)
+        self.write(str(node))
 
     def decodeConstant(self, node):
-        yield node.children[0].value
+        self.write(node.name)
 
-    def decodeToken(self, node):
-        yield node.value
+    decodeNode = Visitor.dispatch
 
-    def getDecoder(self, node, default=decodeRaw):
-        name = ""
-        if not isinstance(node, Token):
-            name = node.data
-        else:
-            name = node.type
-        return self.nodeDecoders.get(name, partial(default, self))
+    def decodeDecNumber(self, node):
+        raw = node.text
+        self.write(str(int(raw)))
 
-    def decodeDecNumber(self, token):
-        raw = token.value
-        yield int(raw)
+    def decodeHexNumber(self, node):
+        raw = node.text
+        self.write(str(int(raw, 16)))
 
-    def decodeHexNumber(self, token):
-        raw = token.value
-        yield int(raw, 16)
+    def decodeOctNumber(self, node):
+        raw = node.text
+        self.write(str(int(raw, 8)))
 
-    def decodeOctNumber(self, token):
-        raw = token.value
-        yield int(raw, 8)
+    def decodeBinNumber(self, node):
+        raw = node.text
+        self.write(str(int(raw, 2)))
 
-    def decodeBinNumber(self, token):
-        raw = token.value
-        yield int(raw, 2)
+    def decodeFloat(self, node):
+        raw = node.text
+        self.write("%sf" % float(raw.replace('f', '')))
 
-    def decodeFloat(self, token):
-        raw = token.value
-        yield "%sf" % float(raw.replace('f', ''))
-
-    def decodeFixed(self, token):
-        raw = token.value
-        yield "%s_fp" % decimal.Decimal(raw)
-
-    def decodeNumber(self, node):
-        sub_node = node.children[0]
-        yield self.getDecoder(sub_node)(sub_node)
+    def decodeFixed(self, node):
+        raw = node.text
+        self.write("%s_fp" % decimal.Decimal(raw))
 
     def decodeString(self, node):
-        raw = node.children[0].value
-        if node.children[0].type == "STRING":
-            yield raw[1:-1]
-        else:
-            yield raw[3:-3]
-
-    def decodeLiteral(self, node):
-        if len(node.children) > 1:
-            data = ['R"===(']
-            for sub_node in node.children:
-                data += self.consume(self.decodeString(sub_node))
-            data += ')==="'
-            yield "".join(data)
+        if len(node.values) > 1:
+            self.write('R"===(%s)==="' % "".join(node.values))
         else:
-            sub_node = node.children[0]
-            result = self.consume(self.getDecoder(sub_node)(sub_node))
-            if sub_node.data == "string":
-                result = "\"%s\"" % result
-            yield result
+            self.write("\"%s\"" % node.values[0])
 
     def decodeRVal(self, node):
-        yield self.getDecoder(node)(node)
-
-    def decodeName(self, node):
-        yield self.decodeToken(node.children[0])
+        self.decodeNode(node)
 
     def decodeRuntimeVal(self, node):
-        sub_node = node.children[0]
-        yield self.getDecoder(sub_node)(sub_node)
+        self.write(node.name)
 
     def decodeScalarTypeName(self, node):
-        yield self.decodeToken(node.children[0])
+        self.write(node.name)
 
     def decodeAggregateTypeName(self, node):
-        raw = node.children[0]
-        typename = self.consume(self.getDecoder(raw)(raw))
-        yield "std::vector<%s>" % typename
+        self.write("std::vector<%s>" % node.name)
 
     def decodePointerTypeName(self, node):
-        child_nodes = node.children
-        data = []
-        for sub_node in child_nodes:
-            data += self.consume(self.getDecoder(sub_node)(sub_node))
-        yield "".join(data)
+        self.write(node.name)
 
     def decodeModule(self, node):
-        child_nodes = node.children
-        data = ["namespace "]
-        for sub_node in child_nodes[1:]:
-            data += self.consume(self.getDecoder(sub_node)(sub_node))
-            data += ' '
-        yield "".join(data[:-1])
+        self.write("namespace %s " % node.name)
+        self.decodeBody(node.block, self.indent)
+        self.write(" // namespace %s" % node.name)
 
     def decodeImport(self, node):
-        raw = node.children[1]
-        yield "using namespace %s;" % self.consume(self.getDecoder(raw)(raw))
+        self.write("using namespace %s;" % node.module)
 
     def decodeFrom(self, node):
-        raw = node.children
-        params = {}
-        cpp = ""
-        if(raw[3].data != "name"):
-            params = {
-                "module": self.consume(self.getDecoder(raw[1])(raw[1])),
-                "name": self.consume(self.getDecoder(raw[3])(raw[3])),
-            }
+        params = {
+            "module": node.module,
+            "name": node.symbol,
+        }
+        if node.is_type:
             cpp = "using %(name)s = %(module)s::%(name)s;"
         else :
-            params = {
-                "module": self.consume(self.getDecoder(raw[1])(raw[1])),
-                "name": self.consume(self.getDecoder(raw[3])(raw[3])),
-            }
             cpp = "auto& %(name)s = %(module)s::%(name)s;"
-        yield cpp % params
+        self.write(cpp % params)
 
     def defaultNode(self, node, out=sys.stdout):
         print("// ", node, file=out)
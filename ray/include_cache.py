@@ -0,0 +1,90 @@
+import hashlib
+import os
+import pickle
+import time
+
+# NOTE: bump when the cached entries change shape.
+CACHE_VERSION = 1
+# NOTE: a file written this close to its scan may change again within the
+# same mtime tick, so its stat is not trusted and it gets hashed next time.
+RACY_SECONDS = 2
+
+
+class IncludeCache(object):
+
+    def __init__(self, cache_dir="build/cache", scanner="fast", enabled=True):
+        self.cache_dir = cache_dir
+        self.scanner = scanner
+        self.enabled = enabled
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        if enabled:
+            self.load()
+
+    def cacheFile(self):
+        return "%s/includes-%s.pickle" % (self.cache_dir, self.scanner)
+
+    def load(self):
+        try:
+            with open(self.cacheFile(), "rb") as cached:
+                version, entries = pickle.load(cached)
+        except Exception:
+            return # missing, stale or truncated, start empty
+        if version == CACHE_VERSION:
+            self.entries = entries
+
+    def save(self):
+        if not self.enabled or not self.dirty:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_file = self.cacheFile()
+        tmp_file = "%s.%s.tmp" % (cache_file, os.getpid())
+        with open(tmp_file, "wb") as cached:
+            pickle.dump((CACHE_VERSION, self.entries), cached,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+        self.dirty = False
+
+    def lookup(self, filename):
+        entry = self.entries.get(filename) if self.enabled else None
+        if entry is None:
+            self.misses += 1
+            return None
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            self.misses += 1
+            return None
+        if (not entry["racy"] and stat.st_mtime_ns == entry["mtime"]
+                and stat.st_size == entry["size"]):
+            self.hits += 1
+            return entry["source"]
+        # NOTE: touched but possibly unchanged, compare the content hash
+        # before scanning it again.
+        if stat.st_size == entry["size"] and \
+                self.hashFile(filename) == entry["hash"]:
+            self.hits += 1
+            self.stamp(entry, stat)
+            return entry["source"]
+        self.misses += 1
+        return None
+
+    def store(self, filename, source):
+        if not self.enabled:
+            return
+        stat = os.stat(filename)
+        entry = {"hash": self.hashFile(filename), "size": stat.st_size,
+                 "source": source}
+        self.stamp(entry, stat)
+        self.entries[filename] = entry
+
+    def stamp(self, entry, stat):
+        entry["mtime"] = stat.st_mtime_ns
+        entry["racy"] = time.time() - stat.st_mtime < RACY_SECONDS
+        self.dirty = True
+
+    def hashFile(self, filename):
+        with open(filename, "rb") as input:
+            return hashlib.sha256(input.read()).hexdigest()
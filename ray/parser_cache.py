@@ -0,0 +1,106 @@
+import hashlib
+import os
+import pickle
+
+from functools import partial
+
+import lark
+from lark import Lark
+from lark.load_grammar import load_grammar
+
+
+PARSER_OPTIONS = {
+    "earley": {},
+    "lalr": {"parser": 'lalr', "lexer": 'contextual'},
+}
+
+
+class ParserCache(object):
+
+    def __init__(self, cache_dir="build/cache", enabled=True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.parsers = {}
+        self.grammar_keys = {}
+
+    def loadParser(self, grammar_file, transformer=None, **options):
+        # NOTE: the transformer does not change the grammar or the tables,
+        # so it stays out of the cache key and is attached on load.
+        with open(grammar_file) as grammer:
+            source = grammer.read()
+        key = self.cacheKey(source, options)
+        self.grammar_keys[grammar_file] = key
+        parser = self.parsers.get((key, transformer))
+        if parser is None:
+            parser = self.buildParser(source, key, options, transformer)
+            self.parsers[(key, transformer)] = parser
+        return parser
+
+    def cacheKey(self, source, options):
+        digest = hashlib.sha256()
+        digest.update(lark.__version__.encode('utf8'))
+        digest.update(repr(sorted(options.items())).encode('utf8'))
+        digest.update(source.encode('utf8'))
+        return digest.hexdigest()
+
+    def cacheFile(self, key):
+        return "%s/parser-%s.pickle" % (self.cache_dir, key)
+
+    def buildParser(self, source, key, options, transformer=None):
+        if transformer is not None:
+            options = dict(options, transformer=transformer)
+        if not self.enabled:
+            return Lark(source, **options)
+        cache_file = self.cacheFile(key)
+        if options.get('parser') == 'lalr':
+            return self.buildLalr(source, cache_file, options)
+        return self.buildEarley(source, cache_file, options)
+
+    def buildLalr(self, source, cache_file, options):
+        # NOTE: lalr tables serialize completely so nothing is recomputed
+        # on a warm start.
+        transformer = options.get('transformer')
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "rb") as cached:
+                    return self.loadLalr(cached, transformer)
+            except Exception:
+                pass # stale or truncated entry, rebuild it below
+        parser = Lark(source, **options)
+        # NOTE: saved without the transformer, it would be pickled with the
+        # options otherwise.
+        parser.options.transformer = None
+        self.store(cache_file, parser.save)
+        parser.options.transformer = transformer
+        return parser
+
+    def loadLalr(self, cached, transformer):
+        if transformer is None:
+            return Lark.load(cached)
+        # NOTE: Lark.load takes no options in this lark release, _load is
+        # what Lark(cache=...) itself uses to hand over the transformer.
+        return Lark.__new__(Lark)._load(cached, transformer=transformer)
+
+    def buildEarley(self, source, cache_file, options):
+        # NOTE: lark can not serialize an earley parser so we cache the
+        # loaded grammar instead, which is the bulk of the startup cost.
+        grammar = None
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "rb") as cached:
+                    grammar = pickle.load(cached)
+            except Exception:
+                grammar = None
+        if grammar is None:
+            grammar, _ = load_grammar(source, '<string>', None, False)
+            self.store(cache_file, partial(pickle.dump, grammar,
+                                           protocol=pickle.HIGHEST_PROTOCOL))
+        return Lark(grammar, **options)
+
+    def store(self, cache_file, dump):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = "%s.%s.tmp" % (cache_file, os.getpid())
+        with open(tmp_file, "wb") as cached:
+            dump(cached)
+        os.replace(tmp_file, cache_file)
+
@@ -0,0 +1,67 @@
+import os
+
+VISITING = 1
+DONE = 2
+
+
+class IncludeError(Exception):
+    pass
+
+
+class IncludeGraph(object):
+
+    def __init__(self, search_dirs):
+        self.search_dirs = list(search_dirs)
+        self.edges = {}
+        self.resolved = {}
+
+    def canonical(self, filename):
+        return os.path.realpath(filename)
+
+    def resolve(self, name, including_file=None):
+        # NOTE: names resolve the same from every file, so each one is only
+        # looked up once.
+        path = self.resolved.get(name)
+        if path is not None:
+            return path
+        for directory in self.search_dirs:
+            candidate = os.path.join(directory, "%s.ray" % name)
+            if os.path.isfile(candidate):
+                path = self.canonical(candidate)
+                self.resolved[name] = path
+                return path
+        raise IncludeError("can not find include %s from %s in %s" % (
+            name, including_file, ", ".join(self.search_dirs)))
+
+    def addFile(self, path, includes):
+        self.edges[path] = includes
+
+    def order(self, roots):
+        # NOTE: iterative depth first post order, every file comes after
+        # the files it includes and each file and edge is visited once.
+        order = []
+        state = {}
+        for root in roots:
+            if root in state:
+                continue
+            state[root] = VISITING
+            stack = [(root, iter(self.edges[root]))]
+            while stack:
+                path, includes = stack[-1]
+                for include in includes:
+                    if include not in state:
+                        state[include] = VISITING
+                        stack.append((include, iter(self.edges[include])))
+                        break
+                    if state[include] == VISITING:
+                        raise IncludeError("include cycle: %s" % " -> ".join(
+                            self.cycle(stack, include)))
+                else:
+                    stack.pop()
+                    state[path] = DONE
+                    order.append(path)
+        return order
+
+    def cycle(self, stack, include):
+        paths = [path for path, _ in stack]
+        return paths[paths.index(include):] + [include]
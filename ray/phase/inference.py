@@ -1,42 +1,44 @@
-from collections import defaultdict
-from functools import partial
+from collections import defaultdict, deque
 from io import StringIO
 
-from lark import Lark
-from lark.lexer import Token
-
-from symbol import Symbol, Scope ,SymbolLocation
+from symbol import Symbol, Scope, ScopeIndex, SymbolLocation
 from type_defs import Type_Def
-
-class SymbolProcessor(object):
-    
+from visitor import Visitor
+
+class SymbolProcessor(Visitor):
+    handlers = {
+        "module_statement": "visitModule",
+        "class_define": "visitClassDef",
+        "class_declaration": "visitClassDecl",
+        "extern_type": "visitExternType",
+        "extern_func": "visitExternFunc",
+        "operator_define": "visitOperatorDef",
+        "import_statement": "visitImport",
+        "function_define": "visitFunctionDef",
+        "scalar_define": "visitVarDef",
+        "aggregate_define": "visitVarDef",
+        "scalar_declaration": "visitVarDecl",
+        "aggregate_declaration": "visitVarDecl",
+        "while_statement": "visitWhile",
+        "condtional_statement": "visitCondition",
+        "if_statement": "visitIf",
+        "elif_statement": "visitElif",
+        "else_statement": "visitElse",
+        "comment": "visitNoop",
+        "emit_statement": "visitNoop",
+        "return_statement": "visitReturn",
+        "from_statement": "visitFrom",
+        "expression_statement": "visitExpression",
+        "call_expression": "visitCall",
+    }
+    default_handler = "visitRaw"
+    # NOTE: block scopes have no symbol of their own, calls made in them
+    # are dependencies of the definition around them.
+    block_scopes = ("if", "elif", "else", "while_loop")
 
     def __init__(self):
-        self.nodeVisitor = {
-            "module_statement": self.visitModule,
-            "class_define": self.visitClassDef,
-            "class_declaration" : self.visitClassDecl,
-            "extern_type": self.visitExternType,
-            "extern_func": self.visitExternFunc,
-            "operator_define": self.visitOperatorDef,
-            "import_statement": self.visitImport,
-            "function_define": self.visitFunctionDef,
-            "paramaters": self.visitParams,
-            "variable_define": self.visitVarDef,
-            "variable_declaration": self.visitVarDecl,
-            "while_statement": self.visitWhile,
-            "condtional_statement": self.visitCondition,
-            "if_statement": self.visitIf,
-            "elif_statement": self.visitElif,
-            "else_statement": self.visitElse,
-            "comment": self.visitNoop,
-            "emit_statement": self.visitNoop,
-            "return_statement": self.visitReturn,
-            "from_statement": self.visitFrom,
-            "expression_statement": self.visitExpression,
-            "call_expression": self.visitCall,
-        }
         self.global_scope = Scope(None)
+        self.index = ScopeIndex()
         self.scope = self.global_scope
         self.symbol_table = {}
         self.func_table = {}
@@ -46,19 +48,66 @@ class SymbolProcessor(object):
         self.type_defs = {}
         self.defered_imports = {}
         self.defered_deps = {}
-        self.depends_on = defaultdict(list)
+        # NOTE: each dependency once in the order first called, a call that
+        # is visited again adds nothing.
+        self.depends_on = defaultdict(dict)
+        self.waiting = defaultdict(list)
+        self.worklist = deque()
+        self.queued = set()
+        self.unresolved = []
     
     def processTree(self, tree):
-        for node in tree.children:
-            if not isinstance(node,Token):
-                self.visitNode(node)
-        self.registerSymbols(self.global_scope)
-        for node, scope in self.defered_imports.items():
-            self.scope = scope
+        for node in tree.statements:
             self.visitNode(node)
-        for node, scope in self.defered_deps.items():
-            self.scope = scope
+        self.registerSymbols(self.global_scope)
+        self.resolveDeferred()
+
+    def resolveDeferred(self):
+        # NOTE: worklist fixpoint over the deferred nodes. Registering the
+        # modules can satisfy any of them, so each is tried once in the
+        # order it was deferred. A node that still fails waits on the name
+        # it needs and is only tried again when an import brings that name
+        # into view, which keeps the work linear in the wait edges. A node
+        # woken before it ran is only queued once.
+        self.waiting.clear()
+        self.queueNodes(self.defered_imports.items())
+        self.queueNodes(self.defered_deps.items())
+        while self.worklist:
+            node, self.scope = self.worklist.popleft()
+            self.queued.discard(node)
             self.visitNode(node)
+        self.scope = self.global_scope
+        self.unresolved = [(name, node, scope)
+                           for name, waiters in self.waiting.items()
+                           for node, scope in waiters]
+
+    def deferNode(self, node, name, deferred):
+        deferred[node] = self.scope
+        self.waiting[name].append((node, self.scope))
+
+    def queueNodes(self, items):
+        queued = self.queued
+        for node, scope in items:
+            if node not in queued:
+                queued.add(node)
+                self.worklist.append((node, scope))
+
+    def wakeNames(self, names):
+        waiting = self.waiting
+        if len(names) < len(waiting):
+            woken = [name for name in names if name in waiting]
+        else:
+            woken = [name for name in waiting if name in names]
+        for name in woken:
+            self.queueNodes(waiting.pop(name))
+
+    def outstanding(self, deferred):
+        return sum(node in deferred for _, node, _ in self.unresolved)
+
+    def reportUnresolved(self, out):
+        for name, node, scope in self.unresolved:
+            out.write("unresolved %s %s in %s\n" % (
+                node.kind, name, scope.qualified_name or "<global>"))
 
 
     def registerSymbols(self, scope):
@@ -79,8 +128,7 @@ class SymbolProcessor(object):
             table.setdefault(symbol.qualified_name, symbol)
         
 
-    def visitNode(self, node):
-        self.getVisitor(node)(node)
+    visitNode = Visitor.dispatch
 
     def visitNoop(self, node):
         pass
@@ -91,43 +139,56 @@ class SymbolProcessor(object):
         # TODO for retrun value binding?
 
     def visitExpression(self, node):
-        self.visitNode(node.children[0])
+        self.visitNode(node.expression)
 
     def visitCall(self, node):
-        raw = node.children
-        symbol_name = raw[0].children[0].value
+        symbol_name = node.name
         #TODO handel argument dependices.
         #args = []
         scope = self.scope
         sym = self.lookupSymbol(scope, symbol_name)
         if sym is None:
-            self.defered_deps[node]=self.scope
+            self.deferNode(node, symbol_name, self.defered_deps)
         else:
-            parent_scope = self.scope.parent
-            scope_name = self.scope.name
-            parent = parent_scope.symbols[scope_name]
-            self.depends_on[parent].append(sym)
+            parent = self.ownerSymbol(self.scope)
+            if parent is not None:
+                self.depends_on[parent].setdefault(sym, node)
 
     def lookupSymbol(self, scope, symbol_name):
-        sym = None
-        while  scope is not None:
-            sym = scope.symbols.get(symbol_name)
-            if sym:
-                break
-            else:
-                scope = scope.parent
-        return sym
+        return self.index.lookup(scope, symbol_name)
+
+    def declareSymbol(self, name, sym):
+        return self.index.declare(self.scope, name, sym)
+
+    def ownerSymbol(self, scope):
+        while scope.type in self.block_scopes:
+            scope = scope.parent
+        if scope.parent is None:
+            return None
+        return scope.parent.symbols.get(scope.name)
 
 
     def visitFrom(self, node):
-        pass
+        module = self.module_table.get(node.module)
+        if module is None:
+            self.deferNode(node, node.module, self.defered_imports)
+            return
+        sym = self.index.moduleSymbol(module.scope, node.symbol)
+        if sym is None:
+            self.deferNode(node, node.symbol, self.defered_imports)
+        else:
+            self.declareSymbol(node.symbol, sym)
+            self.wakeNames((node.symbol,))
 
     def visitReturn(self, node):
         pass
 
-    def visitCondition(self, tree):
-        for node in tree.children:
-            self.visitNode(node)
+    def visitCondition(self, node):
+        self.visitNode(node.if_statement)
+        for elif_node in node.elifs:
+            self.visitNode(elif_node)
+        if node.else_statement is not None:
+            self.visitNode(node.else_statement)
  
     def visitIf(self, node):
         name = "if_line_%s" % node.line
@@ -136,7 +197,7 @@ class SymbolProcessor(object):
                        scope_name=name, parent=self.scope)
         self.scope.scopes.setdefault(name, scope)
         self.scope = scope
-        self.processSubNodes(node.children[-1])
+        self.processSubNodes(node.block)
         self.scope = scope.parent
 
     def visitElif(self, node):
@@ -146,7 +207,7 @@ class SymbolProcessor(object):
                        scope_name=name, parent=self.scope)
         self.scope.scopes.setdefault(name, scope)
         self.scope = scope
-        self.processSubNodes(node.children[-1])
+        self.processSubNodes(node.block)
         self.scope = scope.parent
 
     def visitElse(self, node):
@@ -156,7 +217,7 @@ class SymbolProcessor(object):
                        scope_name=name, parent=self.scope)
         self.scope.scopes.setdefault(name, scope)
         self.scope = scope
-        self.processSubNodes(node.children[-1])
+        self.processSubNodes(node.block)
         self.scope = scope.parent
 
     def visitWhile(self,node):
@@ -166,76 +227,44 @@ class SymbolProcessor(object):
                        scope_name=name, parent=self.scope)
         self.scope.scopes.setdefault(name, scope)
         self.scope = scope
-        self.processSubNodes(node.children[3])
+        self.processSubNodes(node.block)
         self.scope = scope.parent
 
-    def processSubNodes(self, tree):
-        for node in tree.children:
-            if not isinstance(node,Token):
-                self.visitNode(node)
+    def processSubNodes(self, block):
+        for node in block.statements:
+            self.visitNode(node)
 
     def visitVarDecl(self,node):
-        raw = node.children[0]
-        
-        type_name = ""
-        symbol_name = ""
-        sym = None
-
-        if raw.data == 'aggregate_declaration':
-            type_name = "%s[%s]" % (raw.children[0].children[0].value,
-                                    raw.children[2].children[0].children[0].value)
-            symbol_name = raw.children[4].children[0].value
-            sym = Symbol(node, self.scope, symbol_name, "var")
-        else:
-            type_name = raw.children[0].children[0].value
-            symbol_name = raw.children[1].children[0].value
-            sym = Symbol(node, self.scope, symbol_name, "var")
-        
-        self.scope.symbols.setdefault(symbol_name,sym)
+        symbol_name = node.name
+        sym = Symbol(node, self.scope, symbol_name, "var")
+        self.declareSymbol(symbol_name, sym)
 
     def visitVarDef(self,node):
-        raw = node.children[0]
-
-        type_name = ""
-        symbol_name = ""
-        sym = None
-
-        if raw.data == 'aggregate_declaration':
-            type_name = "%s[%s]" % (raw.children[0].children[0].value,
-                                    raw.children[2].children[0].children[0].value)
-            symbol_name = raw.children[4].children[0].value
-            sym = Symbol(node, self.scope, symbol_name, "var")
-        else:
-            type_name = raw.children[0].children[0].value
-            symbol_name = raw.children[1].children[0].value
-            sym = Symbol(node, self.scope, symbol_name, "var")
-        #note use typename to build type later.
-        self.scope.symbols.setdefault(symbol_name, sym)
-
-    def visitParams(self,node):
-        raw = node.children
-        if len(raw) < 3:
-            return # note you should never get here if it parsed
-        for param in range(0,len(raw),4):
-            type_name = raw[param].children[0].value
-            symbol_name = raw[param+2].children[0].value
-            sym = Symbol(raw[param+2], self.scope, symbol_name, "paramater")
-            self.scope.symbols.setdefault(symbol_name, sym)
+        symbol_name = node.name
+        sym = Symbol(node, self.scope, symbol_name, "var")
+        #note use node.type_name to build type later.
+        self.declareSymbol(symbol_name, sym)
+
+    def visitParams(self, params):
+        for param in params:
+            symbol_name = param.name
+            sym = Symbol(param, self.scope, symbol_name, "paramater")
+            self.declareSymbol(symbol_name, sym)
             
     def visitModule(self,node):
-        name = node.children[1].children[0].value
+        name = node.name
         scope_type = "module"
-        scope = Scope(node, scope_type=scope_type,
-                       scope_name=name, parent=self.scope)
-        self.scope.scopes.setdefault(name, scope)
+        # NOTE: modules can be reopened, later blocks add to the first scope.
+        scope = self.scope.scopes.setdefault(name, Scope(
+            node, scope_type=scope_type, scope_name=name, parent=self.scope))
         sym = Symbol(node, scope, name, scope_type)
-        self.scope.symbols.setdefault(name, sym)
+        self.declareSymbol(name, sym)
         self.scope = scope
-        self.processSubNodes(node.children[2])
+        self.processSubNodes(node.block)
         self.scope = scope.parent
 
     def visitClassDecl(self, node):
-        name = node.children[0].children[0].value
+        name = node.type_name.name
         scope_type = "type_decl"
         scope = Scope(node, scope_type=scope_type,
                        scope_name=name, parent=self.scope)
@@ -244,10 +273,10 @@ class SymbolProcessor(object):
         type_def = Type_Def(node, name, sym.qualified_name, "scalar_type")
         self.type_defs.setdefault(sym.qualified_name, type_def)
         sym.type_def = type_def
-        self.scope.symbols.setdefault(name, sym)
+        self.declareSymbol(name, sym)
 
     def visitExternType(self, node):
-        name = node.children[0].children[0].value
+        name = node.type_name.name
         scope_type = "extern_type"
         # TODO support external types with bodies.
         scope = Scope(node, scope_type=scope_type,
@@ -257,10 +286,10 @@ class SymbolProcessor(object):
         type_def = Type_Def(node, name, sym.qualified_name, "scalar_type")
         self.type_defs.setdefault(sym.qualified_name, type_def)
         sym.type_def = type_def
-        self.scope.symbols.setdefault(name, sym)
+        self.declareSymbol(name, sym)
 
     def visitClassDef(self, node):
-        name = node.children[0].children[0].value
+        name = node.type_name.name
         scope_type = "type"
         scope = Scope(node, scope_type=scope_type,
                        scope_name=name, parent=self.scope)
@@ -269,64 +298,62 @@ class SymbolProcessor(object):
         type_def = Type_Def(node, name, sym.qualified_name, "scalar_type")
         self.type_defs.setdefault(sym.qualified_name, type_def)
         sym.type_def = type_def
-        self.scope.symbols.setdefault(name, sym)
+        self.declareSymbol(name, sym)
         self.scope = scope
-        self.processSubNodes(node.children[1])
+        self.processSubNodes(node.block)
         self.scope = scope.parent
 
     def visitOperatorDef(self,node):
-        name = node.children[0].children[0].value
+        name = node.name
         scope_type = "operator"
         scope = Scope(node, scope_type=scope_type,
                        scope_name=name, parent=self.scope)
         self.scope.scopes.setdefault(name, scope)
         sym = Symbol(node, scope, name, scope_type)
-        self.scope.symbols.setdefault(name, sym)
+        self.declareSymbol(name, sym)
         self.scope = scope
-        self.processSubNodes(node.children[-1])
+        self.processSubNodes(node.block)
         self.scope = scope.parent
 
     def visitImport(self,node):
-        name = node.children[1].children[0].value
+        name = node.module
         module = self.module_table.get(name)
         if(module):
-            for sym in module.scope.symbols.values():
-                self.scope.symbols.setdefault(sym.name, sym)
+            self.index.importScope(self.scope, module.scope)
+            # NOTE: waiters are woken by name wherever they are, that also
+            # covers scopes that see this one through their own imports.
+            # Names further down the chain were in view of the module
+            # already, they are only checked while something still waits.
+            self.wakeNames(module.scope.symbols)
+            if self.waiting:
+                for imported in self.index.importedScopes(module.scope):
+                    self.wakeNames(imported.symbols)
         else:
-            self.defered_imports[node]=self.scope
+            self.deferNode(node, name, self.defered_imports)
 
     def visitFunctionDef(self,node):
-        name = node.children[1].children[0].value
+        name = node.name
         scope_type = "function"
         scope = Scope(node, scope_type=scope_type,
                        scope_name=name, parent=self.scope)
 
         self.scope.scopes.setdefault(name, scope)
         sym = Symbol(node, scope, name, scope_type)
-        self.scope.symbols.setdefault(name, sym)
+        self.declareSymbol(name, sym)
         self.scope = scope
-        if len(node.children) >5 :
-            self.visitParams(node.children[3]) # params
-        self.processSubNodes(node.children[-1]) # body
+        self.visitParams(node.params)
+        self.processSubNodes(node.block) # body
         self.scope = scope.parent
 
     def visitExternFunc(self, node):
-        name = node.children[1].children[0].value
+        name = node.name
         scope_type = "external_function"
         scope = Scope(node, scope_type=scope_type,
                        scope_name=name, parent=self.scope)
 
         self.scope.scopes.setdefault(name, scope)
         sym = Symbol(node, scope, name, scope_type)
-        self.scope.symbols.setdefault(name, sym)
+        self.declareSymbol(name, sym)
         self.scope = scope
-        self.visitParams(node.children[3]) # params
+        self.visitParams(node.params)
         self.scope = scope.parent
-
-    def getVisitor(self, node, default=visitRaw):
-        name = ""
-        if not isinstance(node, Token):
-            name = node.data
-        else:
-            name = node.type
-        return self.nodeVisitor.get(name, partial(default, self))
@@ -0,0 +1,289 @@
+import sys
+
+from lark import Transformer
+from lark.lexer import Token
+
+from ray_ast import (AggregateDeclaration, AggregateDefine, AggregateTypeName,
+                     Argument, AssignmentStatement, BinExpression, Block,
+                     BlockStatement, CallExpression, Comment,
+                     ConditionStatement, Constant, ConstructExpression,
+                     ElifStatement, ElseStatement, EmitStatement,
+                     ExpressionStatement, ExternFuncStatement,
+                     ExternModuleStatement, ExternTypeStatement,
+                     ExternVarStatement, ForStatement, FromStatement, Func,
+                     FuncDeclaration, IfStatement, ImportStatement,
+                     IncludeStatement, Module, NUMBER_LITERALS, Operator,
+                     Param, PointerTypeName, PostfixExpression,
+                     PrefixExpression, Program, ReturnStatement,
+                     RuntimeValue, ScalarDeclaration, ScalarDefine,
+                     ScalarTypeName, StringLiteral, Struct,
+                     StructDeclaration, WhileStatement)
+
+
+def text(token):
+    # NOTE: names repeat all over a program, interned plain strings are
+    # shared and much smaller than the tokens they came from.
+    return sys.intern(str(token))
+
+
+def nodes(children):
+    return [child for child in children if not isinstance(child, Token)]
+
+
+def optionalList(children, index):
+    value = children[index]
+    return value if isinstance(value, list) else []
+
+
+class RayLowering(Transformer):
+    # NOTE: passed to the lalr parser as its transformer, so each rule is
+    # lowered as soon as it is reduced and no lark tree is ever built. The
+    # earley parser can not do that and runs transform on its tree instead.
+    # Callbacks get the children the tree would have had, names and
+    # strings come back as tokens and are turned into plain strings by the
+    # node that owns them.
+    __visit_tokens__ = False
+
+    def start(self, children):
+        return Program(1, children)
+
+    def comment(self, children):
+        token = children[0]
+        return Comment(token.line, str(token))
+
+    def block(self, children):
+        return Block(children[0].line, children[1:-1])
+
+    def block_statement(self, children):
+        return BlockStatement(children[0].line, children[1:-1])
+
+    def return_statement(self, children):
+        return ReturnStatement(children[0].line, children[0])
+
+    def scalar_type_name(self, children):
+        token = children[0]
+        return ScalarTypeName(token.line, text(token))
+
+    def aggregate_type_name(self, children):
+        token = children[0]
+        return AggregateTypeName(token.line, text(token), [
+            str(child) for child in children[2:-1]])
+
+    def pointer_type_name(self, children):
+        token = children[0]
+        return PointerTypeName(token.line, text(token))
+
+    def constant_name(self, children):
+        token = children[0]
+        return Constant(token.line, text(token))
+
+    def name(self, children):
+        return children[0]
+
+    def digit(self, children):
+        return children[0]
+
+    def string(self, children):
+        return children[0]
+
+    def escaped_block(self, children):
+        return children[0]
+
+    def subscript(self, children):
+        return children[1]
+
+    def variable_define(self, children):
+        return children[0]
+
+    def variable_declaration(self, children):
+        return children[0]
+
+    def number(self, children):
+        token = children[0]
+        return NUMBER_LITERALS[token.type](token.line, str(token))
+
+    def literal_value(self, children):
+        first = children[0]
+        if not isinstance(first, Token):
+            return first
+        values = []
+        for token in children:
+            if token.type == "STRING":
+                values.append(str(token)[1:-1])
+            else:
+                values.append(str(token)[3:-3])
+        return StringLiteral(first.line, values)
+
+    def runtime_value(self, children):
+        token = children[0]
+        return RuntimeValue(token.line, text(token))
+
+    def bin_expression(self, children):
+        lhs, op, rhs = children
+        return BinExpression(lhs.line, lhs, str(op), rhs)
+
+    def prefix_expression(self, children):
+        op, value = children
+        return PrefixExpression(op.line, str(op), value)
+
+    def postfix_expression(self, children):
+        value, index = children
+        return PostfixExpression(value.line, value, index)
+
+    def call_expression(self, children):
+        token = children[0]
+        return CallExpression(token.line, text(token),
+                              optionalList(children, 2))
+
+    def construct_expression(self, children):
+        first = children[0]
+        if isinstance(first, Token):
+            return ConstructExpression(first.line, None, children[1])
+        return ConstructExpression(first.line, first.name,
+                                   optionalList(children, 2))
+
+    def arguments(self, children):
+        args = []
+        name = None
+        for child in children:
+            if not isinstance(child, Token):
+                line = child.line if name is None else name.line
+                args.append(Argument(line, None if name is None else
+                                     text(name), child))
+                name = None
+            elif child.type == "NAME":
+                name = child
+        return args
+
+    def paramaters(self, children):
+        params = []
+        default = False
+        for child in children:
+            if not isinstance(child, Token):
+                if default:
+                    params[-1].default = child
+                else:
+                    params.append(Param(child.line, child, None, None))
+            elif child.type == "NAME":
+                params[-1].name = text(child)
+            default = isinstance(child, Token) and child.type == "ASSIGNMENT"
+        return params
+
+    def assignment_statement(self, children):
+        token = children[0]
+        rest = children[1:-1]
+        offset = rest[1] if len(rest) == 5 else None
+        return AssignmentStatement(token.line, text(token), offset,
+                                   str(rest[-2]), rest[-1])
+
+    def expression_statement(self, children):
+        expression = children[0]
+        return ExpressionStatement(expression.line, expression)
+
+    def condtional_statement(self, children):
+        else_statement = None
+        if isinstance(children[-1], ElseStatement):
+            else_statement = children.pop()
+        return ConditionStatement(children[0].line, children[0],
+                                  children[1:], else_statement)
+
+    def if_statement(self, children):
+        return IfStatement(children[0].line, children[1], children[3])
+
+    def elif_statement(self, children):
+        return ElifStatement(children[0].line, children[1], children[3])
+
+    def else_statement(self, children):
+        return ElseStatement(children[0].line, children[0])
+
+    def while_statement(self, children):
+        return WhileStatement(children[0].line, children[1], children[3])
+
+    def for_statement(self, children):
+        return ForStatement(children[0].line, children[1], text(children[2]),
+                            children[3], children[5])
+
+    def include_statement(self, children):
+        return IncludeStatement(children[0].line, str(children[1]))
+
+    def emit_statement(self, children):
+        return EmitStatement(children[0].line, text(children[1]),
+                             str(children[3])[3:-3])
+
+    def extern_type(self, children):
+        type_name = children[0]
+        return ExternTypeStatement(type_name.line, type_name,
+                                   nodes(children[1:]))
+
+    def extern_func(self, children):
+        return_type = children[0]
+        return ExternFuncStatement(return_type.line, return_type,
+                                   text(children[1]),
+                                   optionalList(children, 3))
+
+    def extern_var(self, children):
+        declaration = children[0]
+        return ExternVarStatement(declaration.line, declaration)
+
+    def extern_module(self, children):
+        type_name = children[0]
+        return ExternModuleStatement(type_name.line, type_name,
+                                     nodes(children[1:]))
+
+    def class_define(self, children):
+        type_name = children[0]
+        parent = children[2] if len(children) == 4 else None
+        return Struct(type_name.line, type_name, parent, children[-1])
+
+    def class_declaration(self, children):
+        type_name = children[0]
+        return StructDeclaration(type_name.line, type_name)
+
+    def function_define(self, children):
+        return_type = children[0]
+        return Func(return_type.line, return_type, text(children[1]),
+                    optionalList(children, 3), children[-1])
+
+    def function_declaration(self, children):
+        return_type = children[0]
+        return FuncDeclaration(return_type.line, return_type,
+                               text(children[1]), optionalList(children, 3))
+
+    def operator_define(self, children):
+        first = children[0]
+        name = text(first) if isinstance(first, Token) else first.name
+        return Operator(first.line, name, optionalList(children, 2),
+                        children[-1])
+
+    def scalar_define(self, children):
+        type_name = children[0]
+        return ScalarDefine(type_name.line, type_name, text(children[1]),
+                            children[3])
+
+    def aggregate_define(self, children):
+        type_name = children[0]
+        return AggregateDefine(type_name.line, type_name, children[2],
+                               text(children[4]), children[6])
+
+    def scalar_declaration(self, children):
+        type_name = children[0]
+        return ScalarDeclaration(type_name.line, type_name, text(children[1]))
+
+    def aggregate_declaration(self, children):
+        type_name = children[0]
+        return AggregateDeclaration(type_name.line, type_name, children[2],
+                                    text(children[4]))
+
+    def module_statement(self, children):
+        return Module(children[0].line, children[1].name, children[2])
+
+    def import_statement(self, children):
+        return ImportStatement(children[0].line, children[1].name)
+
+    def from_statement(self, children):
+        symbol = children[3]
+        if isinstance(symbol, Token):
+            return FromStatement(children[0].line, children[1].name,
+                                 text(symbol), False)
+        return FromStatement(children[0].line, children[1].name,
+                             symbol.name, True)
@@ -1,62 +1,256 @@
+import mmap
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import partial
 from io import StringIO
 
-from lark import Lark
 from lark.lexer import Token
 
-class IncludeProcessor(object):
+from include_cache import IncludeCache
+from parser_cache import ParserCache
+from phase.include_graph import IncludeGraph
+from phase.source_map import SourceMap
+from ray_ast import Program
+from visitor import Visitor
+
+# NOTE: a lark parser can not be pickled, so each worker process of the
+# include pool loads its own copy, normally straight from the parser cache.
+worker_parser = None
+
+# NOTE: mirrors include.ebnf, a directive only counts at the start of a line
+# or straight after another directive.
+INCLUDE_LINE = re.compile(
+    rb'^[ \t\f\r]*((?:@@include\s*[a-zA-Z0-9./]+\s*;[ \t\f\r]*)+)',
+    re.MULTILINE)
+INCLUDE = re.compile(rb'@@include\s*([a-zA-Z0-9./]+)\s*;')
+
+
+class ScannedSource(object):
+
+    def __init__(self, text, includes):
+        self.text = text
+        self.includes = includes
+
+
+def loadIncludeParser(parser_cache):
+    return parser_cache.loadParser("grammer/include.ebnf", parser='lalr',
+                                   lexer='standard')
+
+
+def initIncludeWorker(cache_dir, enabled):
+    global worker_parser
+    worker_parser = loadIncludeParser(ParserCache(cache_dir, enabled))
+
+
+def parseIncludeFile(filename, parser=None):
+    with open(filename) as input:
+        size = os.fstat(input.fileno()).st_size
+        return (parser or worker_parser).parse(input.read()), size
+
+
+def scanIncludeFile(filename, parser=None):
+    # NOTE: finds the include directives without a parse and copies every
+    # other byte through, the lark path is kept for --include-scanner lark.
+    with open(filename, "rb") as input:
+        size = os.fstat(input.fileno()).st_size
+        if size == 0:
+            return ScannedSource("", []), size
+        with mmap.mmap(input.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data.find(b"@@include") == -1:
+                chunks = [data[:]]
+                includes = []
+            else:
+                chunks, includes = scanIncludes(data)
+    text = b"".join(chunks).decode('utf8')
+    if not text.endswith("\n"):
+        text += "\n"
+    return ScannedSource(text, includes), size
+
+
+def scanIncludes(data):
+    # NOTE: directives are rare, so jump between them with find and only
+    # run the regex on the lines that contain one.
+    chunks = []
+    includes = []
+    start = 0
+    position = data.find(b"@@include")
+    while position != -1:
+        line_start = data.rfind(b"\n", 0, position) + 1
+        match = INCLUDE_LINE.match(data, max(line_start, start))
+        if match is None or match.end(1) <= position:
+            position = data.find(b"@@include", position + 1)
+            continue
+        chunks.append(data[start:match.start(1)])
+        includes += [name.decode('utf8')
+                     for name in INCLUDE.findall(match.group(1))]
+        start = match.end(1)
+        position = data.find(b"@@include", start)
+    chunks.append(data[start:])
+    return chunks, includes
 
-    def __init__(self, prefix, **kwargs):
+
+class IncludeProcessor(Visitor):
+    handlers = {
+        "include_statement": "decodeInclude",
+    }
+    default_handler = "decodeRaw"
+
+    def __init__(self, prefix, parser_cache=None, jobs=1, pool="process",
+                 scanner="fast", include_cache=None, include_dirs=(),
+                 **kwargs):
         self.prefix = prefix
-        with open("grammer/include.ebnf") as grammer:
-            self.parser = Lark(grammer.read(), parser='lalr',
-                               lexer='standard')
-        self.nodeDecoders = {
-            "include_statement": self.decodeInclude,
-        }
+        self.graph = IncludeGraph([prefix] + list(include_dirs))
+        if parser_cache is None:
+            parser_cache = ParserCache(enabled=False)
+        self.parser_cache = parser_cache
+        if include_cache is None:
+            include_cache = IncludeCache(scanner=scanner, enabled=False)
+        self.include_cache = include_cache
+        self.scanner = scanner
+        self.parser = None
+        if scanner == "lark":
+            self.parser = loadIncludeParser(parser_cache)
         self.all_includes = {}
+        self.source_map = SourceMap()
+        self.unity_lines = {}
+        self.bytes_read = 0
+        self.jobs = jobs
+        self.pool = pool
+        self.executor = None
+
+    def processSrc(self, main_filename, output_file=None):
+        if self.jobs > 1:
+            self.executor = self.createExecutor()
+        roots = [self.graph.canonical(filename) for filename in
+                 ('runtime/header.ray', main_filename, 'runtime/footer.ray')]
+        try:
+            include_files = roots
+            while include_files:
+                include_files = self.processSrcFiles(include_files)
+            self.include_cache.save()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+        unity = StringIO()
+        self.unifySrc(unity, roots)
+        source = unity.getvalue()
+        if output_file is not None:
+            output_file.write(source)
+        return source
+
+    def createExecutor(self):
+        if self.pool == "thread":
+            return ThreadPoolExecutor(max_workers=self.jobs)
+        if self.scanner == "fast":
+            return ProcessPoolExecutor(max_workers=self.jobs)
+        return ProcessPoolExecutor(max_workers=self.jobs,
+                                   initializer=initIncludeWorker,
+                                   initargs=(self.parser_cache.cache_dir,
+                                             self.parser_cache.enabled))
 
-    def processSrc(self, main_filename, output_file):
-        include_files = ['runtime/footer.ray', main_filename]
-        while include_files:
-            include_files = self.processSrcFiles(include_files)
-        include_files = ['runtime/header.ray']
-        while include_files: # NOTE: This will normally loop once
-            include_files = self.processSrcFiles(include_files)
-        self.unifySrc(output_file)
+    def unifySrc(self, output_file, roots):
+        self.source_map = SourceMap()
+        self.unity_lines = {}
+        line = 1
+        for filename in self.graph.order(roots):
+            self.unity_lines[filename] = line
+            source = self.all_includes[filename]
+            if isinstance(source, ScannedSource):
+                self.source_map.add(line, filename, 1)
+                line += source.text.count("\n")
+                output_file.write(source.text)
+            else:
+                # NOTE: the lark path writes one line per RAW token, which
+                # keeps the line it was read from.
+                for node in source.children:
+                    if not self.isInclude(node):
+                        self.source_map.add(line, filename, node.line)
+                        line += 1
+                self.processTree(source, output_file)
 
-    def unifySrc(self, output_file):
-        for tree in reversed(list(self.all_includes.keys())):
-            self.processTree(self.all_includes[tree],output_file)
+    def spliceTrees(self, parse):
+        # NOTE: parses every file on its own, normally through the tree
+        # cache, and joins the trees in unity order. Lines are shifted so
+        # positions match a parse of the unity source.
+        statements = []
+        for filename, line in self.unity_lines.items():
+            text = self.fileText(filename)
+            if not text.strip():
+                continue
+            tree = parse(text, line - 1)
+            statements += tree.statements
+        return Program(1, statements)
+
+    def fileText(self, filename):
+        source = self.all_includes[filename]
+        if isinstance(source, ScannedSource):
+            return source.text
+        text = StringIO()
+        self.processTree(source, text)
+        return text.getvalue()
 
     def processSrcFiles(self, include_files):
         for file in include_files:
             if file not in  self.all_includes:
                 self.all_includes[file] = None
         includes = set()
-        for filename in include_files:
-            found_includes = self.extractIncludes(filename)
+        for filename, parsed in zip(include_files,
+                                    self.parseFiles(include_files)):
+            found_includes = self.extractIncludes(filename, *parsed)
             for file in found_includes:
                 if file not in self.all_includes:
                     includes.add(file)
-        return includes
+        # NOTE: the unity order comes from the include graph, the frontier
+        # is only sorted to keep the parse order reproducible.
+        return sorted(includes)
 
-    def extractIncludes(self, filename):
-        tree = None
-        includes = set()
-        with open(filename) as input:
-            tree = self.parser.parse(input.read())
-        for node in tree.children:
-            if self.isInclude(node):
-                includes.add(self.extractInclude(node))
+    def parseFiles(self, include_files):
+        # NOTE: files the include cache vouches for are neither opened nor
+        # counted in bytes_read.
+        parsed_files = {}
+        missing = []
+        for filename in include_files:
+            source = self.include_cache.lookup(filename)
+            if source is None:
+                missing.append(filename)
+            else:
+                parsed_files[filename] = (source, 0)
+        for filename, parsed in zip(missing, self.readFiles(missing)):
+            self.include_cache.store(filename, parsed[0])
+            parsed_files[filename] = parsed
+        return [parsed_files[filename] for filename in include_files]
+
+    def readFiles(self, include_files):
+        read = scanIncludeFile if self.scanner == "fast" else parseIncludeFile
+        if self.executor is None or len(include_files) < 2:
+            return [read(filename, self.parser) for filename in include_files]
+        if self.pool == "thread":
+            return self.executor.map(partial(read, parser=self.parser),
+                                     include_files)
+        return self.executor.map(read, include_files)
+
+    def extractIncludes(self, filename, tree, size):
+        self.bytes_read += size
+        if isinstance(tree, ScannedSource):
+            names = tree.includes
+        else:
+            names = [self.extractInclude(node) for node in tree.children
+                     if self.isInclude(node)]
+        includes = []
+        for name in names:
+            path = self.graph.resolve(name, filename)
+            if path not in includes:
+                includes.append(path)
+        self.graph.addFile(filename, includes)
         self.all_includes[filename] = tree
         return includes
     
     def extractInclude(self, node):
-        raw = node.children[0]
-        result = self.getDecoder(raw)(raw)
-        args = (self.prefix, result.replace('@@include','').replace(' ', '').replace(';',''))
-        return "%s/%s.ray" % args
+        result = self.decodeNode(node.children[0])
+        return result.replace('@@include','').replace(' ', '').replace(';','')
 
     def isInclude(self,node):
         return ((not isinstance(node, Token)) 
@@ -75,7 +269,7 @@ class IncludeProcessor(object):
         if not isinstance(node, Token):
             result = []
             for child in node.children:
-                result.append(self.getDecoder(child)(child))
+                result.append(self.decodeNode(child))
             return " ".join(result)
         else:
             return str(node)
@@ -83,10 +277,9 @@ class IncludeProcessor(object):
     def decodeInclude(self, node):
         return ""
         
-    def getDecoder(self, node, default=decodeRaw):
-        name = ""
-        if not isinstance(node, Token):
-            name = node.data
-        else:
-            name = node.type
-        return self.nodeDecoders.get(name, partial(default, self))
\ No newline at end of file
+    def decodeNode(self, node):
+        # NOTE: include.ebnf trees are lark trees, which all share a type,
+        # so these dispatch on the rule or token name instead.
+        if isinstance(node, Token):
+            return self.kind_handlers[node.type](self, node)
+        return self.kind_handlers[node.data](self, node)
\ No newline at end of file
@@ -0,0 +1,172 @@
+import re
+
+from collections import defaultdict
+
+from ray_ast import iterNodes
+
+# NOTE: top level and module level statements that define one symbol, the
+# units reachability keeps or prunes, with the field that names them.
+DEFINITIONS = {
+    "function_define": "name",
+    "function_declaration": "name",
+    "class_define": "type_name",
+    "class_declaration": "type_name",
+    "scalar_define": "name",
+    "aggregate_define": "name",
+    "scalar_declaration": "name",
+    "aggregate_declaration": "name",
+}
+# NOTE: nodes that refer to another symbol by name, with the field holding
+# the name. Calls are also in SymbolProcessor.depends_on, types, values and
+# constructors are only found here.
+REFERENCES = {
+    "call_expression": "name",
+    "construct_expression": "type_name",
+    "runtime_value": "name",
+    "assignment_statement": "name",
+    "scalar_type_name": "name",
+    "aggregate_type_name": "name",
+    "pointer_type_name": "name",
+}
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# NOTE: symbols that live in the scope they are declared in, every other
+# category owns a scope of its own, same rule as Symbol.qualified_name.
+SCOPED_CATEGORIES = ("var", "paramater", "args")
+
+
+class Reachability(object):
+    # NOTE: marks every symbol reachable from main and from the @@emit
+    # blocks, following calls, type and value references, imports, the
+    # definitions around a symbol and everything inside a struct. Emitted
+    # code is opaque, so any definition named anywhere in it is a root, and
+    # so is every definition of a name a reference failed to resolve.
+
+    def __init__(self, symbol_builder, language="cpp"):
+        self.symbol_builder = symbol_builder
+        self.language = language
+        self.units = {}
+        self.definitions = defaultdict(list)
+        self.references = defaultdict(list)
+        self.roots = []
+        self.emitted_names = set()
+        self.unresolved_names = set()
+        self.reached = set()
+        self.pruned = set()
+        self.declarations = 0
+        self.pruned_declarations = 0
+        self.pruned_modules = 0
+
+    def processTree(self, tree):
+        global_scope = self.symbol_builder.global_scope
+        self.collectStatements(tree.statements, global_scope, None)
+        main = global_scope.symbols.get("main")
+        if main is not None:
+            self.roots.append(main)
+        for name in self.emitted_names | self.unresolved_names:
+            self.roots += self.definitions.get(name, ())
+        self.reach()
+        self.prune(tree.statements, False)
+
+    def collectStatements(self, statements, scope, owner):
+        # NOTE: owner is the module around the statements, None at the top
+        # level where every statement that is not a definition is kept.
+        for node in statements:
+            kind = node.kind
+            if kind == "module_statement":
+                sym = scope.symbols[node.name]
+                self.addUnit(node, node.name, sym)
+                self.collectStatements(node.block.statements,
+                                       scope.scopes[node.name], sym)
+            elif kind in DEFINITIONS:
+                name = self.definedName(node)
+                sym = scope.symbols.get(name)
+                if sym is None:
+                    continue
+                self.addUnit(node, name, sym)
+                self.addReferences(sym, node, sym.scope)
+            elif kind == "emit_statement":
+                if node.language == self.language:
+                    self.emitted_names.update(IDENTIFIER.findall(node.code))
+                    if owner is not None:
+                        self.roots.append(owner)
+            else:
+                self.addReferences(owner, node, scope)
+
+    def addUnit(self, node, name, sym):
+        self.units[node] = sym
+        self.definitions[name].append(sym)
+
+    def definedName(self, node):
+        name = getattr(node, DEFINITIONS[node.kind])
+        return name if isinstance(name, str) else name.name
+
+    def addReferences(self, sym, node, scope):
+        references = self.references[sym]
+        unresolved_names = self.unresolved_names
+        index = self.symbol_builder.index
+        lookupSymbol = self.symbol_builder.lookupSymbol
+        module_table = self.symbol_builder.module_table
+        for sub_node in iterNodes(node):
+            kind = sub_node.kind
+            if kind in ("import_statement", "from_statement"):
+                module = module_table.get(sub_node.module)
+                if module is None:
+                    unresolved_names.add(sub_node.module)
+                    continue
+                references.append(module)
+                if kind == "from_statement":
+                    target = index.moduleSymbol(module.scope, sub_node.symbol)
+                    if target is not None:
+                        references.append(target)
+                    else:
+                        unresolved_names.add(sub_node.symbol)
+                continue
+            field = REFERENCES.get(kind)
+            if field is None:
+                continue
+            name = getattr(sub_node, field)
+            if name:
+                target = lookupSymbol(scope, name)
+                if target is not None:
+                    references.append(target)
+                else:
+                    unresolved_names.add(name)
+
+    def container(self, sym):
+        scope = sym.scope
+        if sym.category not in SCOPED_CATEGORIES:
+            scope = scope.parent
+        if scope is None:
+            return None
+        return self.symbol_builder.ownerSymbol(scope)
+
+    def reach(self):
+        # NOTE: iterative depth first walk, every symbol and edge once.
+        reached = self.reached
+        depends_on = self.symbol_builder.depends_on
+        stack = self.roots + self.references.get(None, [])
+        while stack:
+            sym = stack.pop()
+            if sym is None or sym in reached:
+                continue
+            reached.add(sym)
+            stack += self.references.get(sym, ())
+            stack += depends_on.get(sym, ())
+            stack.append(self.container(sym))
+
+    def prune(self, statements, outer_pruned):
+        # NOTE: only the outermost pruned statements go in pruned, the
+        # emitter skips them whole. Definitions inside are still counted.
+        for node in statements:
+            sym = self.units.get(node)
+            if sym is None:
+                continue
+            pruned = outer_pruned or sym not in self.reached
+            if pruned and not outer_pruned:
+                self.pruned.add(node)
+            if node.kind == "module_statement":
+                self.pruned_modules += pruned
+                self.prune(node.block.statements, pruned)
+            else:
+                self.declarations += 1
+                self.pruned_declarations += pruned
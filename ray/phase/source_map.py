@@ -0,0 +1,32 @@
+import os
+
+from bisect import bisect_right
+
+
+class SourceMap(object):
+    # NOTE: maps unity source lines back to (file, line). Each segment is a
+    # run of unity lines that follow one file line for line.
+
+    def __init__(self):
+        self.starts = []
+        self.segments = []
+
+    def add(self, unity_line, filename, line):
+        if self.segments:
+            last_file, last_line = self.segments[-1]
+            if (last_file == filename and
+                    last_line + unity_line - self.starts[-1] == line):
+                return
+        self.starts.append(unity_line)
+        self.segments.append((filename, line))
+
+    def lookup(self, unity_line):
+        index = bisect_right(self.starts, unity_line) - 1
+        if index < 0:
+            return None
+        filename, line = self.segments[index]
+        return filename, line + unity_line - self.starts[index]
+
+    def displayName(self, filename):
+        relative = os.path.relpath(filename)
+        return filename if relative.startswith("..") else relative
@@ -1,41 +1,168 @@
 import argparse
+import sys
+from functools import partial
 from io import StringIO
 
-from lark import Lark
-
+from compact_ir import CompactTree
+from cpp.modules import ModuleSplitter, ShardSplitter
 from cpp.transformer import RayToCpp
+from phase.include_graph import IncludeError
+from phase.lowering import RayLowering
 from phase.preprocessor import IncludeProcessor
 from phase.inference import SymbolProcessor
+from phase.reachability import Reachability
+from ray_ast import iterNodes
+from symbol import SymbolWriter
+from include_cache import IncludeCache
+from parser_cache import ParserCache, PARSER_OPTIONS
+from tree_cache import TreeCache, frozenTrees, pausedGc
+from timings import PhaseTimer
+
+
+def main(args, timer=None):
+    with frozenTrees() as freezeTrees:
+        compileProgram(args, timer, freezeTrees)
 
 
-def main(args):
+def compileProgram(args, timer, freezeTrees):
 
     print(args)
     main_file = "%s/%s" % (args.prefix,args.source)
     unity_file = "%s/unity.ray" % args.build_dir 
+    if timer is None:
+        timer = PhaseTimer()
+
+    with timer.phase("grammar"):
+        parser_cache = ParserCache("%s/cache" % args.build_dir,
+                                   enabled=args.parser_cache)
+        include_cache = IncludeCache("%s/cache" % args.build_dir,
+                                     scanner=args.include_scanner,
+                                     enabled=args.include_cache)
+        preprocessor = IncludeProcessor(args.prefix,
+                                        parser_cache=parser_cache,
+                                        include_cache=include_cache,
+                                        jobs=args.include_jobs,
+                                        pool=args.include_pool,
+                                        scanner=args.include_scanner,
+                                        include_dirs=args.include_dirs)
+        # NOTE: lalr lowers each rule to ray_ast nodes as it parses, earley
+        # builds a lark tree that is lowered afterwards.
+        lowering = RayLowering()
+        inline = args.parser == "lalr"
+        parser = parser_cache.loadParser("grammer/ray.ebnf",
+                                         transformer=lowering if inline
+                                         else None,
+                                         **PARSER_OPTIONS[args.parser])
+        parse = parser.parse
+        if not inline:
+            parse = lambda text: lowering.transform(parser.parse(text))
+    with timer.phase("preprocess"):
+        source = preprocessor.processSrc(main_file)
+        if args.emit_unity:
+            with open(unity_file, "w") as output_file:
+                output_file.write(source)
+    timer.count("files_included", len(preprocessor.all_includes))
+    timer.count("bytes_read", preprocessor.bytes_read)
+    timer.count("include_cache_hits", include_cache.hits)
+    timer.count("include_cache_misses", include_cache.misses)
 
-    preprocessor = IncludeProcessor(args.prefix)
-    with open(unity_file, "w") as output_file:
-        preprocessor.processSrc(main_file,output_file)
-        
     out_file = "%s/%s" % (args.build_dir, args.out)
-    parser = None
-    with open("grammer/ray.ebnf") as grammer:
-        parser = Lark(grammer.read(), propagate_positions=True)
-    tree = None
-    with open(unity_file) as inpute_file:
-        tree = parser.parse(inpute_file.read())
-    symbol_builder = SymbolProcessor()
-    symbol_builder.processTree(tree)
-    transPiler = RayToCpp(args.prefix)
-    print("printing symbols  start \n\n\n")
-    print(symbol_builder.global_scope)
-    print("\n\n\nprinting symbols  end")
+    modules_dir = "%s/modules" % args.build_dir
+    shards_dir = "%s/shards" % args.build_dir
+    compact = CompactTree() if args.compact_ir else None
+    with timer.phase("parse"), pausedGc():
+        if args.tree_cache:
+            tree_cache = TreeCache(
+                "%s/cache" % args.build_dir,
+                grammar_key=parser_cache.grammar_keys["grammer/ray.ebnf"])
+            parse_file = partial(tree_cache.parse, parse)
+            if compact is not None:
+                parse_file = compact.packing(parse_file)
+            tree = preprocessor.spliceTrees(parse_file)
+            timer.count("trees_parsed", tree_cache.parsed)
+            timer.count("trees_loaded", tree_cache.loaded)
+        else:
+            tree = parse(source)
+            if compact is not None:
+                tree = compact.packProgram(tree)
+    freezeTrees()
+    if compact is not None:
+        timer.count("compact_nodes", compact.nodeCount())
+        timer.count("compact_bytes", compact.nbytes())
+    with timer.phase("symbols"):
+        symbol_builder = SymbolProcessor()
+        symbol_builder.processTree(tree)
+    timer.count("symbols", len(symbol_builder.symbol_table))
+    # NOTE: deferrals that never resolved, the ones that resolved later cost
+    # no more than a direct lookup.
+    timer.count("deferred_imports", symbol_builder.outstanding(
+        symbol_builder.defered_imports))
+    timer.count("deferred_deps", symbol_builder.outstanding(
+        symbol_builder.defered_deps))
+    timer.count("unresolved", len(symbol_builder.unresolved))
+    symbol_builder.reportUnresolved(sys.stderr)
+    if args.dump_symbols:
+        with timer.phase("dump"):
+            symbols_file = args.symbols_file or "%s/symbols.%s" % (
+                args.build_dir, args.dump_symbols)
+            with open(symbols_file, "w") as output_file:
+                SymbolWriter(output_file, args.dump_symbols).write(
+                    symbol_builder.global_scope)
     # print(symbol_builder.func_table['main'])
-    with open(out_file, "w") as output_file:
-        transPiler.processTree(tree,output_file)
+    reachability = None
+    if args.prune:
+        with timer.phase("reachability"):
+            reachability = Reachability(symbol_builder)
+            reachability.processTree(tree)
+        timer.count("reachable_symbols", len(reachability.reached))
+        timer.count("pruned_declarations", reachability.pruned_declarations)
+        timer.count("pruned_modules", reachability.pruned_modules)
+    with timer.phase("codegen"):
+        source_map = None
+        if args.line_directives:
+            source_map = preprocessor.source_map
+        transPiler = RayToCpp(args.prefix, source_map=source_map,
+                              pruned=reachability.pruned
+                              if reachability else frozenset())
+        splitter = None
+        if args.split_modules:
+            splitter = ModuleSplitter(transPiler, symbol_builder)
+            split_dir = modules_dir
+        elif args.shards:
+            splitter = ShardSplitter(transPiler, symbol_builder,
+                                     shards=args.shards)
+            split_dir = shards_dir
+        if splitter is not None:
+            files, written = splitter.processTree(tree, split_dir)
+            timer.count("cpp_files", len(files))
+            timer.count("cpp_files_written", len(written))
+            timer.count("cpp_bytes", sum(len(text) for text in files.values()))
+            if args.shards:
+                timer.count("shard_cost_max", max(splitter.loads))
+        else:
+            with open(out_file, "w") as output_file:
+                transPiler.processTree(tree, output_file, jobs=args.jobs)
+                timer.count("cpp_bytes", output_file.tell())
+    if reachability is not None:
+        # NOTE: rendered again only to be measured, pruned code is never
+        # written.
+        transPiler.pruned = frozenset()
+        pruned_bytes = sum(len(transPiler.render(node))
+                           for node in reachability.pruned)
+        timer.count("pruned_bytes", pruned_bytes)
+        print("pruned %d of %d declarations, %d modules, %d bytes of c++" % (
+            reachability.pruned_declarations, reachability.declarations,
+            reachability.pruned_modules, pruned_bytes))
 
-if __name__ == "__main__":
+    if args.timings or args.timings_json:
+        timer.count("tree_nodes", sum(1 for _ in iterNodes(tree)))
+    if args.timings:
+        timer.report()
+    if args.timings_json:
+        timer.dump(args.timings_json)
+
+
+def parseArgs(argv=None):
     cmd = argparse.ArgumentParser(description='Ray Compiler')
     cmd.add_argument('--src', dest='source', default="main.ray",
                      help='ray source file', type=str)
@@ -47,7 +174,86 @@ if __name__ == "__main__":
                      help='output file', type=str)
     cmd.add_argument('--build-dir', dest='build_dir', default="build",
                      help='ray build dir', type=str)
-    
-    args = cmd.parse_args()
+    split = cmd.add_mutually_exclusive_group()
+    split.add_argument('--split-modules', dest='split_modules',
+                       action='store_true',
+                       help='write a .hpp/.cpp pair per module and a runtime'
+                            ' translation unit to the modules build dir'
+                            ' instead of a single output file')
+    split.add_argument('--shards', dest='shards', default=0,
+                       help='split the definitions into this many cost'
+                            ' balanced translation units in the shards'
+                            ' build dir, sharing one common header',
+                       type=int)
+    split.add_argument('--prune', dest='prune', action='store_true',
+                       help='leave definitions that can not be reached from'
+                            ' main or an @@emit block out of the single'
+                            ' output file')
+    cmd.add_argument('--emit-unity', dest='emit_unity', action='store_true',
+                     help='write the preprocessed source to the build dir'
+                          ' as unity.ray for debugging')
+    cmd.add_argument('--include-jobs', dest='include_jobs', default=1,
+                     help='workers used to parse each level of includes',
+                     type=int)
+    cmd.add_argument('--include-pool', dest='include_pool', default="process",
+                     choices=["process", "thread"],
+                     help='worker pool used when --include-jobs is above 1',
+                     type=str)
+    cmd.add_argument('--include-dir', dest='include_dirs', default=[],
+                     action='append',
+                     help='extra directory searched for includes after the'
+                          ' source dir, can be repeated', type=str)
+    cmd.add_argument('--include-scanner', dest='include_scanner',
+                     default="fast", choices=["fast", "lark"],
+                     help='find includes with the regex scanner or parse'
+                          ' every file with grammer/include.ebnf',
+                     type=str)
+    cmd.add_argument('--parser', dest='parser', default="lalr",
+                     choices=sorted(PARSER_OPTIONS),
+                     help='parsing algorithm for ray sources', type=str)
+    cmd.add_argument('--jobs', dest='jobs', default=1,
+                     help='worker processes generating the c++ for the top'
+                          ' level statements of a single output file',
+                     type=int)
+    cmd.add_argument('--line-directives', dest='line_directives',
+                     action='store_true',
+                     help='emit #line directives so compiler errors,'
+                          ' debuggers and profilers point at the ray'
+                          ' sources')
+    cmd.add_argument('--compact-ir', dest='compact_ir', action='store_true',
+                     help='keep the parsed program in array backed storage'
+                          ' and hand the passes views onto it, for unity'
+                          ' builds too large to hold as node objects')
+    cmd.add_argument('--dump-symbols', dest='dump_symbols', default=None,
+                     choices=["json", "text"],
+                     help='write the symbol tables to the build dir as'
+                          ' symbols.json or symbols.text', type=str)
+    cmd.add_argument('--symbols-file', dest='symbols_file', default=None,
+                     help='file for --dump-symbols instead of the build dir',
+                     type=str)
+    cmd.add_argument('--timings', dest='timings', action='store_true',
+                     help='print wall and cpu time per phase and counters')
+    cmd.add_argument('--timings-json', dest='timings_json', default=None,
+                     help='write the phase timings and counters as json',
+                     type=str)
+    cmd.add_argument('--no-parser-cache', dest='parser_cache',
+                     action='store_false',
+                     help='rebuild the grammars instead of loading them'
+                          ' from the build dir cache')
+    cmd.add_argument('--no-include-cache', dest='include_cache',
+                     action='store_false',
+                     help='scan every include instead of reusing unchanged'
+                          ' files from the build dir cache')
+    cmd.add_argument('--no-tree-cache', dest='tree_cache',
+                     action='store_false',
+                     help='parse the whole unity source instead of each file'
+                          ' through the build dir parse tree cache')
+    return cmd.parse_args(argv)
+
+
+if __name__ == "__main__":
     # execute only if run as a script
-    main(args)
+    try:
+        main(parseArgs())
+    except IncludeError as error:
+        sys.exit("ray: %s" % error)
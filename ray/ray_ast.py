@@ -1,3 +1,522 @@
+# NOTE: syntax tree built straight from the lalr parse by phase.lowering.
+# Every node keeps the line of its first token, kind names the grammar rule
+# it came from for the visitor tables and fields lists its children in
+# constructor order, after the line.
+
+
+class Node(object):
+    __slots__ = ("line",)
+    kind = ""
+    fields = ()
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join(
+            "%s=%r" % (field, getattr(self, field)) for field in self.fields))
+
+
+def iterNodes(node):
+    # NOTE: depth first with parents before their children.
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = []
+        for field in node.fields:
+            value = getattr(node, field)
+            if isinstance(value, Node):
+                children.append(value)
+            elif isinstance(value, list):
+                children += [item for item in value if isinstance(item, Node)]
+        stack += reversed(children)
+
+
+class Program(Node):
+    __slots__ = fields = ("statements",)
+    kind = "start"
+
+    def __init__(self, line, statements):
+        self.line = line
+        self.statements = statements
+
+
+class Comment(Node):
+    __slots__ = fields = ("text",)
+    kind = "comment"
+
+    def __init__(self, line, text):
+        self.line = line
+        self.text = text
+
+
+class Block(Node):
+    __slots__ = fields = ("statements",)
+    kind = "block"
+
+    def __init__(self, line, statements):
+        self.line = line
+        self.statements = statements
+
+
+class BlockStatement(Block):
+    __slots__ = ()
+    kind = "block_statement"
+
+
+class Module(Node):
+    __slots__ = fields = ("name", "block")
+    kind = "module_statement"
+
+    def __init__(self, line, name, block):
+        self.line = line
+        self.name = name
+        self.block = block
+
+
+class ImportStatement(Node):
+    __slots__ = fields = ("module",)
+    kind = "import_statement"
+
+    def __init__(self, line, module):
+        self.line = line
+        self.module = module
+
+
+class FromStatement(Node):
+    __slots__ = fields = ("module", "symbol", "is_type")
+    kind = "from_statement"
+
+    def __init__(self, line, module, symbol, is_type):
+        self.line = line
+        self.module = module
+        self.symbol = symbol
+        self.is_type = is_type
+
+
+class IncludeStatement(Node):
+    __slots__ = fields = ("path",)
+    kind = "include_statement"
+
+    def __init__(self, line, path):
+        self.line = line
+        self.path = path
+
+
+class ScalarTypeName(Node):
+    __slots__ = fields = ("name",)
+    kind = "scalar_type_name"
+
+    def __init__(self, line, name):
+        self.line = line
+        self.name = name
+
+
+class AggregateTypeName(Node):
+    __slots__ = fields = ("name", "sizes")
+    kind = "aggregate_type_name"
+
+    def __init__(self, line, name, sizes):
+        self.line = line
+        self.name = name
+        self.sizes = sizes
+
+
+class PointerTypeName(Node):
+    __slots__ = fields = ("name",)
+    kind = "pointer_type_name"
+
+    def __init__(self, line, name):
+        self.line = line
+        self.name = name
+
+
+class Param(Node):
+    __slots__ = fields = ("type_name", "name", "default")
+    kind = "paramater"
+
+    def __init__(self, line, type_name, name, default):
+        self.line = line
+        self.type_name = type_name
+        self.name = name
+        self.default = default
+
+
+class Argument(Node):
+    __slots__ = fields = ("name", "value")
+    kind = "argument"
+
+    def __init__(self, line, name, value):
+        self.line = line
+        self.name = name
+        self.value = value
+
+
+class Struct(Node):
+    __slots__ = fields = ("type_name", "parent", "block")
+    kind = "class_define"
+
+    def __init__(self, line, type_name, parent, block):
+        self.line = line
+        self.type_name = type_name
+        self.parent = parent
+        self.block = block
+
+
+class StructDeclaration(Node):
+    __slots__ = fields = ("type_name",)
+    kind = "class_declaration"
+
+    def __init__(self, line, type_name):
+        self.line = line
+        self.type_name = type_name
+
+
+class Func(Node):
+    __slots__ = fields = ("return_type", "name", "params", "block")
+    kind = "function_define"
+
+    def __init__(self, line, return_type, name, params, block):
+        self.line = line
+        self.return_type = return_type
+        self.name = name
+        self.params = params
+        self.block = block
+
+
+class FuncDeclaration(Node):
+    __slots__ = fields = ("return_type", "name", "params")
+    kind = "function_declaration"
+
+    def __init__(self, line, return_type, name, params):
+        self.line = line
+        self.return_type = return_type
+        self.name = name
+        self.params = params
+
+
+class Operator(Node):
+    __slots__ = fields = ("name", "params", "block")
+    kind = "operator_define"
+
+    def __init__(self, line, name, params, block):
+        self.line = line
+        self.name = name
+        self.params = params
+        self.block = block
+
+
+class ScalarDefine(Node):
+    __slots__ = fields = ("type_name", "name", "value")
+    kind = "scalar_define"
+
+    def __init__(self, line, type_name, name, value):
+        self.line = line
+        self.type_name = type_name
+        self.name = name
+        self.value = value
+
+
+class AggregateDefine(Node):
+    __slots__ = fields = ("type_name", "size", "name", "value")
+    kind = "aggregate_define"
+
+    def __init__(self, line, type_name, size, name, value):
+        self.line = line
+        self.type_name = type_name
+        self.size = size
+        self.name = name
+        self.value = value
+
+
+class ScalarDeclaration(Node):
+    __slots__ = fields = ("type_name", "name")
+    kind = "scalar_declaration"
+
+    def __init__(self, line, type_name, name):
+        self.line = line
+        self.type_name = type_name
+        self.name = name
+
+
+class AggregateDeclaration(Node):
+    __slots__ = fields = ("type_name", "size", "name")
+    kind = "aggregate_declaration"
+
+    def __init__(self, line, type_name, size, name):
+        self.line = line
+        self.type_name = type_name
+        self.size = size
+        self.name = name
+
+
+class AssignmentStatement(Node):
+    __slots__ = fields = ("name", "offset", "op", "value")
+    kind = "assignment_statement"
+
+    def __init__(self, line, name, offset, op, value):
+        self.line = line
+        self.name = name
+        self.offset = offset
+        self.op = op
+        self.value = value
+
+
+class ExpressionStatement(Node):
+    __slots__ = fields = ("expression",)
+    kind = "expression_statement"
+
+    def __init__(self, line, expression):
+        self.line = line
+        self.expression = expression
+
+
+class ReturnStatement(Node):
+    __slots__ = fields = ("value",)
+    kind = "return_statement"
+
+    def __init__(self, line, value):
+        self.line = line
+        self.value = value
+
+
+class ConditionStatement(Node):
+    __slots__ = fields = ("if_statement", "elifs", "else_statement")
+    kind = "condtional_statement"
+
+    def __init__(self, line, if_statement, elifs, else_statement):
+        self.line = line
+        self.if_statement = if_statement
+        self.elifs = elifs
+        self.else_statement = else_statement
+
+
+class IfStatement(Node):
+    __slots__ = fields = ("predicate", "block")
+    kind = "if_statement"
+
+    def __init__(self, line, predicate, block):
+        self.line = line
+        self.predicate = predicate
+        self.block = block
+
+
+class ElifStatement(IfStatement):
+    __slots__ = ()
+    kind = "elif_statement"
+
+
+class ElseStatement(Node):
+    __slots__ = fields = ("block",)
+    kind = "else_statement"
+
+    def __init__(self, line, block):
+        self.line = line
+        self.block = block
+
+
+class WhileStatement(Node):
+    __slots__ = fields = ("predicate", "block")
+    kind = "while_statement"
+
+    def __init__(self, line, predicate, block):
+        self.line = line
+        self.predicate = predicate
+        self.block = block
+
+
+class ForStatement(Node):
+    __slots__ = fields = ("type_name", "name", "iterable", "block")
+    kind = "for_statement"
+
+    def __init__(self, line, type_name, name, iterable, block):
+        self.line = line
+        self.type_name = type_name
+        self.name = name
+        self.iterable = iterable
+        self.block = block
+
+
+class EmitStatement(Node):
+    __slots__ = fields = ("language", "code")
+    kind = "emit_statement"
+
+    def __init__(self, line, language, code):
+        self.line = line
+        self.language = language
+        self.code = code
+
+
+class ExternTypeStatement(Node):
+    __slots__ = fields = ("type_name", "members")
+    kind = "extern_type"
+
+    def __init__(self, line, type_name, members):
+        self.line = line
+        self.type_name = type_name
+        self.members = members
+
+
+class ExternFuncStatement(Node):
+    __slots__ = fields = ("return_type", "name", "params")
+    kind = "extern_func"
+
+    def __init__(self, line, return_type, name, params):
+        self.line = line
+        self.return_type = return_type
+        self.name = name
+        self.params = params
+
+
+class ExternVarStatement(Node):
+    __slots__ = fields = ("declaration",)
+    kind = "extern_var"
+
+    def __init__(self, line, declaration):
+        self.line = line
+        self.declaration = declaration
+
+
+class ExternModuleStatement(Node):
+    __slots__ = fields = ("type_name", "members")
+    kind = "extern_module"
+
+    def __init__(self, line, type_name, members):
+        self.line = line
+        self.type_name = type_name
+        self.members = members
+
+
+class BinExpression(Node):
+    __slots__ = fields = ("lhs", "op", "rhs")
+    kind = "bin_expression"
+
+    def __init__(self, line, lhs, op, rhs):
+        self.line = line
+        self.lhs = lhs
+        self.op = op
+        self.rhs = rhs
+
+
+class PrefixExpression(Node):
+    __slots__ = fields = ("op", "value")
+    kind = "prefix_expression"
+
+    def __init__(self, line, op, value):
+        self.line = line
+        self.op = op
+        self.value = value
+
+
+class PostfixExpression(Node):
+    __slots__ = fields = ("value", "index")
+    kind = "postfix_expression"
+
+    def __init__(self, line, value, index):
+        self.line = line
+        self.value = value
+        self.index = index
+
+
+class CallExpression(Node):
+    __slots__ = fields = ("name", "args")
+    kind = "call_expression"
+
+    def __init__(self, line, name, args):
+        self.line = line
+        self.name = name
+        self.args = args
+
+
+class ConstructExpression(Node):
+    # NOTE: type_name is None for a braced initializer list.
+    __slots__ = fields = ("type_name", "args")
+    kind = "construct_expression"
+
+    def __init__(self, line, type_name, args):
+        self.line = line
+        self.type_name = type_name
+        self.args = args
+
+
+class RuntimeValue(Node):
+    __slots__ = fields = ("name",)
+    kind = "runtime_value"
+
+    def __init__(self, line, name):
+        self.line = line
+        self.name = name
+
+
+class Constant(Node):
+    __slots__ = fields = ("name",)
+    kind = "constant_name"
+
+    def __init__(self, line, name):
+        self.line = line
+        self.name = name
+
+
+class StringLiteral(Node):
+    # NOTE: values are the string bodies without quotes, adjacent strings
+    # in the source are kept apart.
+    __slots__ = fields = ("values",)
+    kind = "string"
+
+    def __init__(self, line, values):
+        self.line = line
+        self.values = values
+
+
+class NumberLiteral(Node):
+    __slots__ = fields = ("text",)
+
+    def __init__(self, line, text):
+        self.line = line
+        self.text = text
+
+
+class DecLiteral(NumberLiteral):
+    __slots__ = ()
+    kind = "DEC_NUMBER"
+
+
+class HexLiteral(NumberLiteral):
+    __slots__ = ()
+    kind = "HEX_NUMBER"
+
+
+class OctLiteral(NumberLiteral):
+    __slots__ = ()
+    kind = "OCT_NUMBER"
+
+
+class BinLiteral(NumberLiteral):
+    __slots__ = ()
+    kind = "BIN_NUMBER"
+
+
+class FloatLiteral(NumberLiteral):
+    __slots__ = ()
+    kind = "FLOAT_NUMBER"
+
+
+class FixedPointLiteral(NumberLiteral):
+    __slots__ = ()
+    kind = "FIXED_POINT_NUMBER"
+
+
+NUMBER_LITERALS = {literal.kind: literal for literal in (
+    DecLiteral, HexLiteral, OctLiteral, BinLiteral, FloatLiteral,
+    FixedPointLiteral)}
+
+NODE_TYPES = {name: value for name, value in list(globals().items())
+              if isinstance(value, type) and issubclass(value, Node)}
+
+
+# NOTE: the design classes for the typed program model the later phases
+# are meant to build, kept from before the syntax nodes above. They are
+# not syntax nodes. Names the syntax nodes took over (Module, Func,
+# StringLiteral, ...) are only defined once, above.
+
 class Field(object):
     def __init__(self, type_def, name, parent, value=None, qualifiers=[]):
         self.type_def = type_def
@@ -16,22 +535,6 @@ class Scope(object):
         self.qualifed_name = name if parent is None else "%s%s%s" % (
             parent.name,seperator,name)
 
-class Module(Scope):
-    def __init__(self, name , parent = None):
-        super().__init__(name, parent, '.')
-        self.type_defs = {}
-        self.statements = []
-        self.scopes = {}
-
-class Block(Scope):
-    ident = 0
-    def __init__(self, parent):
-        super().__init__("block%s" % Block.ident, parent, '-')
-        Block.ident+=1
-        self.type_defs = {}
-        self.statements = []
-        self.scopes = {}
-
 class TypeDef(Scope):
     max_type_id = 0
     def __init__(self, name, parent, seperator="."):
@@ -48,7 +551,7 @@ class Variant(TypeDef):
     def __init__(self, name, parent,fields={},active=None):
         super().__init__(name, parent,':')
         self.fields = fields
-        self.active = active 
+        self.active = active
 
 class Enum(TypeDef):
     def __init__(self, name, parent, values={}, value=None):
@@ -64,19 +567,6 @@ class Lamda(TypeDef):
         self.returns = {}
         self.statements = []
 
-class Func(TypeDef):
-    def __init__(self, name, parent):
-        super().__init__(name, parent, ':')
-        self.params = {}
-        self.returns = {}
-        self.statements = []
-
-class Struct(TypeDef):
-    def __init__(self, name, parent):
-        super().__init__(name, parent)
-        self.fields = {}
-        self.functions = {}
-
 class Protocol(TypeDef):
     def __init__(self, name, parent):
         super().__init__(name, parent)
@@ -90,22 +580,6 @@ class Mixins(TypeDef):
 class Statement(object):
     pass
 
-class Comment(Statement):
-    def __init__(self, text):
-        self.text = text
-
-class AssignmentStatement(Statement):
-    def __init__(self, lval, op, rval):
-        super().__init__()
-        self.lval = lval
-        self.op = op
-        self.rval = rval
-
-class ExpressionStatement(Statement):
-    def __init__(self, expression):
-        super().__init__()
-        self.expression = expression
-
 class DefineStatement(Statement):
     def __init__(self, field):
         super().__init__()
@@ -116,63 +590,9 @@ class DeclStatement(Statement):
         super().__init__()
         self.field = field
 
-class ReturnStatement(Statement):
-    def __init__(self, rval):
-        super().__init__()
-        self.rval = rval
-
 class IterationStatement(Statement):
     pass
 
-class ForStatement(IterationStatement):
-    def __init__(self, block, predicate, params=None, continuation=None):
-        super().__init__()
-        self.block = block
-        self.predicate = predicate
-        self.params = params
-        self.continuation = continuation
-
-class WhileStatement(IterationStatement):
-    def __init__(self, block, predicate):
-        super().__init__()
-        self.block = block
-        self.predicate = predicate
-
-class IfStatement(Statement):
-    def __init__(self, block, predicate):
-        super().__init__()
-        self.block = block
-        self.predicate = predicate
-
-class ElifStatement(Statement):
-    def __init__(self, block, predicate):
-        super().__init__()
-        self.block = block
-        self.predicate = predicate
-
-class ElseStatement(Statement):
-    def __init__(self, block):
-        super().__init__()
-        self.block = block
-
-class ConditionStatement(Statement):
-    def __init__(self, if_obj, elifs=[], else_obj=None):
-        super().__init__()
-        self.if_obj = if_obj
-        self.elifs = elifs
-        self.else_obj=else_obj
-
-class ImportStatement(Statement):
-    def __init__(self, module, alias=None):
-        self.module=module
-        self.alias = alias
-
-class FromStatement(Statement):
-    def __init__(self, module, symbol, alias=None):
-        self.module=module
-        self.symbol = symbol
-        self.alias = alias
-
 class UsingStatement(Statement):
     def __init__(self, symbol, alias=None):
         self.symbol = symbol
@@ -187,41 +607,9 @@ class WithStatement(Statement):
 class CompilerStatement(Statement):
     pass
 
-
-class EmitStatement(CompilerStatement):
-    def __init__(self, language, block):
-        super().__init__()
-        self.language = language
-        self.block = block
-
 class ExternStatement(CompilerStatement):
     pass
 
-class ExternTypeStatement(ExternStatement):
-    def __init__(self, name, childern=[]):
-        super().__init__()
-        self.name = name
-        self.childern = childern
-
-class ExternFuncStatement(ExternStatement):
-    def __init__(self, name, return_type, params=[]):
-        super().__init__()
-        self.name = name
-        self.return_type = return_type
-        self.params = params
-
-class ExternVarStatement(ExternStatement):
-    def __init__(self, type_def, name):
-        super().__init__()
-        self.type_def = type_def
-        self.name = name
-
-class ExternModuleStatement(ExternStatement):
-    def __init__(self, name, childern=[]):
-        super().__init__()
-        self.name = name
-        self.childern = childern
-
 class RVal(object):
     def __init__(self, node):
         self.node = node
@@ -237,57 +625,11 @@ class UniaryExpression(Expression):
         self.op = op
         self.val = val
 
-class PrefixExpression(UniaryExpression):
-    def __init__(self, node, constant, op, val):
-        super().__init__(node, constant, op, val)
-
-
-class PostfixExpression(UniaryExpression):
-    def __init__(self, node, constant, op, val):
-        super().__init__(node, constant, op, val)
-
-class BinExpression(Expression):
-    def __init__(self, node, constant, op, lhs, rhs):
-        super().__init__(node, constant)
-        self.op = op
-        self.lhs = lhs
-        self.rhs = rhs
-
-class CallExpression(Expression):
-    def __init__(self, node, constant, name, args):
-        super().__init__(node, constant)
-        self.name = name
-        self.args = args
-
 class LiteralVal(RVal):
     constant = True
     pass
 
-class NumberLiteral(LiteralVal):
-    pass
-
-class DecLiteral(NumberLiteral):
-    pass
-
-class HexLiteral(NumberLiteral):
-    pass
-
-class OctLiteral(NumberLiteral):
-    pass
-
-class BinLiteral(NumberLiteral):
-    pass
-
-class FloatLiteral(NumberLiteral):
-    pass
-
-class FixedPointLiteral(NumberLiteral):
-    pass
-
-class StringLiteral(LiteralVal):
-    pass
-
-class RawStringLiteral(StringLiteral):
+class RawStringLiteral(LiteralVal):
     pass
 
 class BooleanLiteral(LiteralVal):
@@ -307,4 +649,3 @@ class LVal(object):
         self.name = name
         self.type = type_def
         self.constant = constant
-
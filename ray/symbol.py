@@ -1,3 +1,6 @@
+import json
+
+
 
 class Scope(object):
     def __init__(self, node, scope_type="module",
@@ -7,6 +10,10 @@ class Scope(object):
         self.name = scope_name
         self.scopes = {}
         self.symbols = {}
+        self.imports = []
+        self.importers = []
+        self.imported = None
+        self.resolved = {}
         self.parent = parent
         if parent:
             delimiter = '.' if parent.qualified_name else ''
@@ -42,9 +49,184 @@ class Symbol(object):
                 self.category, self.name, self.qualified_name, self.scope.name)
             return result.replace("'",'"')
 
+class ScopeIndex(object):
+    # NOTE: resolves names along the scope chain with a memo in every scope
+    # it passes through, misses included. Each scope caches the flattened
+    # list of the modules it sees through its imports. A lookup in a fresh nested scope
+    # stops at the first parent that has already resolved the name. Every
+    # declaration bumps the version of its name, which retires the memos
+    # for that name only. An import clears the memos under the importing
+    # scope and under every scope that imports it, the only lookups an
+    # import can change.
+
+    def __init__(self):
+        self.versions = {}
+
+    def declare(self, scope, name, sym):
+        current = scope.symbols.setdefault(name, sym)
+        if current is sym:
+            self.versions[name] = self.versions.get(name, 0) + 1
+        return current
+
+    def importScope(self, scope, module_scope):
+        # NOTE: the module is looked through, not copied. A scope sees its
+        # own symbols first, then its imports in order, each followed by
+        # what it imports itself, then its parent.
+        if module_scope is scope or module_scope in scope.imports:
+            return
+        scope.imports.append(module_scope)
+        module_scope.importers.append(scope)
+        self.forgetImports(scope)
+
+    def forgetImports(self, scope):
+        visited = set()
+        stack = [scope]
+        while stack:
+            importing = stack.pop()
+            if importing in visited:
+                continue
+            visited.add(importing)
+            importing.imported = None
+            self.forgetResolved(importing)
+            stack += importing.importers
+
+    def forgetResolved(self, scope):
+        # NOTE: a memo is stored in every scope between the lookup and the
+        # scope that resolved it, so a child without memos has none below
+        # that went through this scope. Each memo is cleared at most once.
+        scope.resolved.clear()
+        stack = [scope]
+        while stack:
+            for sub_scope in stack.pop().scopes.values():
+                if sub_scope.resolved:
+                    sub_scope.resolved.clear()
+                    stack.append(sub_scope)
+
+    def importedScopes(self, scope):
+        # NOTE: depth first in import order, the order the copied symbols
+        # used to shadow each other in. Each module is seen once, so import
+        # cycles end. Built once and kept until a scope down the chain
+        # gains an import.
+        imported = scope.imported
+        if imported is not None:
+            return imported
+        imported = scope.imported = []
+        visited = {scope}
+        stack = scope.imports[::-1]
+        while stack:
+            module_scope = stack.pop()
+            if module_scope in visited:
+                continue
+            visited.add(module_scope)
+            imported.append(module_scope)
+            stack += module_scope.imports[::-1]
+        return imported
+
+    def moduleSymbol(self, module_scope, name):
+        sym = module_scope.symbols.get(name)
+        if sym is None:
+            for imported in self.importedScopes(module_scope):
+                sym = imported.symbols.get(name)
+                if sym is not None:
+                    break
+        return sym
+
+    def lookup(self, scope, name):
+        version = self.versions.get(name, 0)
+        start = scope
+        sym = None
+        while scope is not None:
+            memo = scope.resolved.get(name)
+            if memo is not None and memo[0] == version:
+                sym = memo[1]
+                break
+            sym = scope.symbols.get(name)
+            if sym is not None:
+                break
+            if scope.imports:
+                imported = scope.imported
+                if imported is None:
+                    imported = self.importedScopes(scope)
+                for module_scope in imported:
+                    sym = module_scope.symbols.get(name)
+                    if sym is not None:
+                        break
+                if sym is not None:
+                    break
+            scope = scope.parent
+        if start is not scope:
+            memo = (version, sym)
+            while start is not scope:
+                start.resolved[name] = memo
+                start = start.parent
+        return sym
+
+
 class SymbolLocation(object):
     def __init__(self, symbol, file, line, col):
         self.symbol = symbol
         self.file = file
         self.line = line
-        self.col = col
\ No newline at end of file
+        self.col = col
+
+
+class SymbolWriter(object):
+    # NOTE: writes scopes as it walks them instead of building one string
+    # like Scope.__repr__, so large programs dump in constant memory.
+
+    def __init__(self, out, dump_format="json"):
+        self.out = out
+        self.writers = {"json": self.writeJsonScope,
+                        "text": self.writeTextScope}
+        self.writeScope = self.writers[dump_format]
+
+    def write(self, scope):
+        self.writeScope(scope, 0)
+        self.out.write("\n")
+
+    def writeJsonScope(self, scope, depth):
+        write = self.out.write
+        indent = "\n" + "  " * (depth + 1)
+        write("{")
+        for key, value in (("type", scope.type), ("name", scope.name),
+                           ("qualified_name", scope.qualified_name),
+                           ("parent", scope.parent.name
+                            if scope.parent else "")):
+            write("%s%s: %s," % (indent, json.dumps(key), json.dumps(value)))
+        write("%s\"scopes\": {" % indent)
+        delimiter = ""
+        for name, sub_scope in scope.scopes.items():
+            write("%s%s  %s: " % (delimiter, indent, json.dumps(name)))
+            self.writeJsonScope(sub_scope, depth + 2)
+            delimiter = ","
+        write("%s}," % (indent if scope.scopes else ""))
+        write("%s\"imports\": %s," % (indent, json.dumps(
+            [module_scope.qualified_name for module_scope in scope.imports])))
+        write("%s\"symbols\": {" % indent)
+        delimiter = ""
+        for name, sym in scope.symbols.items():
+            write("%s%s  %s: %s" % (delimiter, indent, json.dumps(name),
+                                    json.dumps(self.symbolFields(sym))))
+            delimiter = ","
+        write("%s}" % (indent if scope.symbols else ""))
+        write("\n%s}" % ("  " * depth))
+
+    def writeTextScope(self, scope, depth):
+        write = self.out.write
+        indent = "  " * depth
+        if depth:
+            write("\n")
+        write("%s%s %s" % (indent, scope.type,
+                           scope.qualified_name or "<global>"))
+        for module_scope in scope.imports:
+            write("\n%s  import %s" % (indent, module_scope.qualified_name))
+        for sym in scope.symbols.values():
+            write("\n%s  %s %s (%s)" % (indent, sym.category, sym.name,
+                                        sym.qualified_name))
+        for sub_scope in scope.scopes.values():
+            self.writeTextScope(sub_scope, depth + 1)
+
+    def symbolFields(self, sym):
+        return {"category": sym.category, "name": sym.name,
+                "qualified_name": sym.qualified_name,
+                "scope": sym.scope.name}
@@ -0,0 +1,66 @@
+import json
+import sys
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+
+class PhaseTimer(object):
+
+    def __init__(self, trace_memory=False):
+        self.phases = {}
+        self.counters = {}
+        # NOTE: tracemalloc slows allocation heavy phases down noticeably,
+        # so peak memory is only recorded when asked for.
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            timing = self.phases.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+            timing["wall"] += time.perf_counter() - wall
+            timing["cpu"] += time.process_time() - cpu
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                timing["peak_bytes"] = max(timing.get("peak_bytes", 0),
+                                           peak - base)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def toDict(self):
+        total = {"wall": sum(t["wall"] for t in self.phases.values()),
+                 "cpu": sum(t["cpu"] for t in self.phases.values())}
+        return {"phases": self.phases, "total": total,
+                "counters": self.counters}
+
+    def report(self, out=None):
+        # NOTE: stderr is looked up on every call, not bound at import, so a
+        # redirected or captured stream is the one written to.
+        if out is None:
+            out = sys.stderr
+        data = self.toDict()
+        print("%-20s %12s %12s" % ("phase", "wall ms", "cpu ms"), file=out)
+        rows = list(data["phases"].items()) + [("total", data["total"])]
+        for name, timing in rows:
+            print("%-20s %12.2f %12.2f" % (
+                name, timing["wall"] * 1000, timing["cpu"] * 1000), file=out)
+        if data["counters"]:
+            print(file=out)
+            print("%-20s %12s" % ("counter", "value"), file=out)
+            for name, value in data["counters"].items():
+                print("%-20s %12d" % (name, value), file=out)
+
+    def dump(self, filename):
+        with open(filename, "w") as out:
+            json.dump(self.toDict(), out, indent=2, sort_keys=True)
@@ -0,0 +1,143 @@
+import gc
+import hashlib
+import os
+import pickle
+
+from contextlib import contextmanager
+
+from ray_ast import NODE_TYPES, Node, iterNodes
+
+# NOTE: cached trees are stored in the shape of the node classes and the
+# lowering that built them, so their sources are part of every key.
+LAYOUT_SOURCES = ("ray_ast.py", os.path.join("phase", "lowering.py"))
+
+
+def layoutKey():
+    digest = hashlib.sha256(b'ray-tree-layout\0')
+    ray_dir = os.path.dirname(os.path.abspath(__file__))
+    for source in LAYOUT_SOURCES:
+        with open(os.path.join(ray_dir, source), "rb") as layout:
+            digest.update(layout.read())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+LAYOUT_KEY = layoutKey()
+
+
+def encodeNode(node):
+    # NOTE: nested tuples of plain values, pickle loads them far faster
+    # than it rebuilds node objects one attribute at a time.
+    return (type(node).__name__, node.line) + tuple(
+        encodeValue(getattr(node, field)) for field in node.fields)
+
+
+def encodeValue(value):
+    if isinstance(value, Node):
+        return encodeNode(value)
+    if isinstance(value, list):
+        return [encodeValue(item) for item in value]
+    return value
+
+
+def decodeNode(data, offset):
+    return NODE_TYPES[data[0]](data[1] + offset, *[
+        decodeValue(value, offset) for value in data[2:]])
+
+
+def decodeValue(value, offset):
+    if isinstance(value, tuple):
+        return decodeNode(value, offset)
+    if isinstance(value, list):
+        return [decodeValue(item, offset) for item in value]
+    return value
+
+
+@contextmanager
+def pausedGc():
+    # NOTE: building trees allocates hundreds of thousands of objects and
+    # no cycles, the collector only slows that down by scanning them over
+    # and over.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+@contextmanager
+def frozenTrees():
+    # NOTE: the trees live until the compile ends, yet every full collection
+    # would scan all of them. The freeze it yields moves everything alive
+    # into the permanent generation once they are built, and leaving
+    # unfreezes it so repeated compiles in one process are collected. A heap
+    # someone else froze is left alone, unfreeze can not tell their objects
+    # from ours.
+    if gc.get_freeze_count():
+        yield lambda: None
+        return
+    try:
+        yield gc.freeze
+    finally:
+        gc.unfreeze()
+
+
+def shiftLines(tree, offset):
+    if offset == 0:
+        return
+    for node in iterNodes(tree):
+        node.line += offset
+
+
+class TreeCache(object):
+
+    def __init__(self, cache_dir="build/cache", grammar_key="", enabled=True):
+        self.cache_dir = cache_dir
+        self.grammar_key = grammar_key
+        self.enabled = enabled
+        self.parsed = 0
+        self.loaded = 0
+
+    def cacheKey(self, text):
+        digest = hashlib.sha256(self.grammar_key.encode('utf8'))
+        digest.update(b'\0%s\0' % LAYOUT_KEY.encode('utf8'))
+        digest.update(text.encode('utf8'))
+        return digest.hexdigest()
+
+    def cacheFile(self, key):
+        return "%s/trees/%s/%s.pickle" % (self.cache_dir, key[:2], key)
+
+    def parse(self, parse, text, offset=0):
+        # NOTE: trees come back with their lines moved down by offset, so
+        # per file trees line up with the unity source.
+        cache_file = None
+        if self.enabled:
+            cache_file = self.cacheFile(self.cacheKey(text))
+            data = self.load(cache_file)
+            if data is not None:
+                self.loaded += 1
+                return decodeNode(data, offset)
+        tree = parse(text)
+        self.parsed += 1
+        if cache_file is not None:
+            self.store(cache_file, encodeNode(tree))
+        shiftLines(tree, offset)
+        return tree
+
+    def load(self, cache_file):
+        if not os.path.exists(cache_file):
+            return None
+        try:
+            with open(cache_file, "rb") as cached:
+                return pickle.loads(cached.read())
+        except Exception:
+            return None # stale or truncated entry, parse it again
+
+    def store(self, cache_file, data):
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = "%s.%s.tmp" % (cache_file, os.getpid())
+        with open(tmp_file, "wb") as cached:
+            pickle.dump(data, cached, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
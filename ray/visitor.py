@@ -0,0 +1,45 @@
+class KindTable(dict):
+    # NOTE: kind to handler, unknown kinds get the default handler and are
+    # remembered so the miss is only paid once.
+
+    def __init__(self, handlers, default):
+        super().__init__(handlers)
+        self.default = default
+
+    def __missing__(self, kind):
+        self[kind] = self.default
+        return self.default
+
+
+class TypeTable(dict):
+    # NOTE: node type to handler, filled in from the kind table the first
+    # time a type is seen. Every ray_ast node and compact ir view type has
+    # a fixed kind, so after warm up dispatch is a single dict hit.
+
+    def __init__(self, kind_handlers):
+        super().__init__()
+        self.kind_handlers = kind_handlers
+
+    def __missing__(self, node_type):
+        handler = self.kind_handlers[getattr(node_type, "kind", None)]
+        self[node_type] = handler
+        return handler
+
+
+class Visitor(object):
+    # NOTE: subclasses list handler method names per node kind in handlers
+    # and name the fallback in default_handler. The tables are compiled once
+    # per class and hold plain functions, so a dispatch neither binds a
+    # method nor allocates anything.
+    handlers = {}
+    default_handler = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.kind_handlers = KindTable({kind: getattr(cls, name)
+                                       for kind, name in cls.handlers.items()},
+                                      getattr(cls, cls.default_handler))
+        cls.type_handlers = TypeTable(cls.kind_handlers)
+
+    def dispatch(self, node):
+        return self.type_handlers[type(node)](self, node)
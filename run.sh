@@ -1,34 +1,11 @@
 #!/bin/bash
+# NOTE: transpiling and compiling are done by the build driver in
+# ray/build.py, which skips any step whose inputs did not change. The c++ is
+# emitted indented, pass --format to run clang-format over it as well.
+# Release=true and extra_flags are still honoured.
 echo
-echo transpileing
-time pipenv run python3 ray/ray.py --prefix input
-echo
-echo fromating
-time clang-format -i build/output.cpp
-echo
-echo compileing
-extra_flags=${extra_flags:-""}
-extra_features=""
-sanatizers=""
-error_checks=""
-if [[ "true" == "${Release:-false}" ]]; then
-    extra_features="-flto=thin -fwhole-program-vtables"
-    optimizations="-O3 -g0 -march=native"
-    error_checks="-pedantic"
-else
-    optimizations="-Os -Og -g -glldb -fstandalone-debug -fno-omit-frame-pointer"
-    sanatizers="-fsanitize=undefined,address"
-    error_checks="-Werror -Wextra-tokens -Wbind-to-temporary-copy -pedantic"
-fi
-#min_runtime="-ffreestanding"
-min_runtime=""
-stdlib="-stdlib=libc++ -lc++ -lc++abi"
-features="-std=c++17 -fpic -pie -fno-exceptions -fstrict-vtable-pointers -ffast-math -fvisibility=protected"
-compiler="clang++-6.0"
-linker="-fuse-ld=lld"
-cmd="${compiler} ${linker} ${optimizations} -o output/output ${stdlib} ${min_runtime} ${features} ${extra_features} ${sanatizers} ${error_checks} ${extra_flags} build/output.cpp"
-echo ${cmd}
-time ${cmd}
+echo building
+time pipenv run python3 ray/build.py build --prefix input --verbose "$@"
 echo
 echo running
 time ./output/output
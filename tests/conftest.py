@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'ray'))
+
+from parser_cache import ParserCache, PARSER_OPTIONS  # noqa: E402
+from phase.lowering import RayLowering  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def parseProgram():
+    parser = ParserCache(enabled=False).loadParser(
+        os.path.join(ROOT, "grammer", "ray.ebnf"), transformer=RayLowering(),
+        **PARSER_OPTIONS["lalr"])
+    return parser.parse
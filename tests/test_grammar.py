@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from parser_cache import ParserCache, PARSER_OPTIONS
+
+GRAMMAR = os.path.join(os.path.dirname(__file__), '..', 'grammer', 'ray.ebnf')
+
+CAPS_NAMES = """
+module B {
+    def struct A {
+        Int32 x := MAX;
+    }
+}
+module IO {
+    import B;
+    from B import A;
+    def func A make(A: a){
+        A[4] buffer;
+        A b := A(MAX_SIZE);
+        return b;
+    }
+}
+@@type GPU;
+"""
+
+
+@pytest.fixture(scope="module")
+def parsers():
+    cache = ParserCache(enabled=False)
+    return {mode: cache.loadParser(GRAMMAR, **options)
+            for mode, options in PARSER_OPTIONS.items()}
+
+
+def typeNames(tree):
+    return [str(node.children[0])
+            for node in tree.find_data("scalar_type_name")]
+
+
+def constantNames(tree):
+    return [str(node.children[0])
+            for node in tree.find_data("constant_name")]
+
+
+@pytest.mark.parametrize("mode", sorted(PARSER_OPTIONS))
+def test_all_caps_module_and_type_names(parsers, mode):
+    tree = parsers[mode].parse(CAPS_NAMES)
+    assert sorted(typeNames(tree)) == sorted([
+        "B", "A", "Int32", "IO", "B", "B", "A", "A", "A", "A", "A", "A",
+        "GPU"])
+    assert sorted(constantNames(tree)) == ["MAX", "MAX_SIZE"]
+
+
+def test_parsers_agree_on_all_caps_names(parsers):
+    trees = [parsers[mode].parse(CAPS_NAMES) for mode in sorted(parsers)]
+    assert trees[0] == trees[1]
+
+
+@pytest.mark.parametrize("source", ["MAX * count;", "A* p;"])
+def test_all_caps_word_before_star_is_a_product(parsers, source):
+    for mode in sorted(parsers):
+        tree = parsers[mode].parse(source)
+        assert list(tree.find_data("bin_expression")), mode
+        assert not list(tree.find_data("pointer_type_name")), mode
+
+
+def test_single_letter_module_lowers(parseProgram):
+    program = parseProgram("module B { }\nmodule C { import B; }\n")
+    modules = [node for node in program.statements
+               if node.kind == "module_statement"]
+    assert [node.name for node in modules] == ["B", "C"]
+    assert modules[1].block.statements[0].module == "B"
@@ -0,0 +1,130 @@
+from collections import Counter
+
+from phase.inference import SymbolProcessor
+from ray_ast import iterNodes
+
+CHAIN = """
+module Runtime {
+    @@type CString;
+    @@func Void print(CString: msg);
+}
+module Base {
+    import Runtime;
+}
+module User {
+    import Base;
+    def func Void go(){
+        print("hi");
+    }
+}
+"""
+
+CYCLE = """
+module Left {
+    import Right;
+    def func Void left(){
+        missing();
+    }
+}
+module Right {
+    import Left;
+    def func Void right(){
+        left();
+    }
+}
+"""
+
+
+def process(parseProgram, source):
+    processor = SymbolProcessor()
+    processor.processTree(parseProgram(source))
+    return processor
+
+
+def dependencies(processor, name):
+    return [sym.qualified_name
+            for sym in processor.depends_on[processor.symbol_table[name]]]
+
+
+def test_names_pass_along_a_chain_of_imports(parseProgram):
+    processor = process(parseProgram, CHAIN)
+    assert dependencies(processor, "User.go") == ["Runtime.print"]
+    assert processor.unresolved == []
+
+
+def test_lookup_sees_an_import_added_down_the_chain(parseProgram):
+    processor = process(parseProgram, CHAIN.replace("import Runtime;", ""))
+    user = processor.module_table["User"].scope
+    base = processor.module_table["Base"].scope
+    runtime = processor.module_table["Runtime"].scope
+    assert processor.lookupSymbol(user, "print") is None
+    processor.index.importScope(base, runtime)
+    assert processor.lookupSymbol(user, "print") is runtime.symbols["print"]
+
+
+def test_import_cycles_end(parseProgram):
+    processor = process(parseProgram, CYCLE)
+    assert dependencies(processor, "Right.right") == ["Left.left"]
+    assert [name for name, _, _ in processor.unresolved] == ["missing"]
+
+
+SINGLE_LETTERS = """
+module A {
+    import B;
+    def func Void run(){
+        hello();
+    }
+}
+module B {
+    def func Void hello(){
+    }
+}
+from A import run;
+"""
+
+
+class CountingProcessor(SymbolProcessor):
+
+    def __init__(self):
+        super().__init__()
+        self.visits = Counter()
+
+    def visitCall(self, node):
+        self.visits[node] += 1
+        super().visitCall(node)
+
+
+def test_single_letter_modules_import_and_from(parseProgram):
+    processor = process(parseProgram, SINGLE_LETTERS)
+    assert dependencies(processor, "A.run") == ["B.hello"]
+    assert processor.global_scope.symbols["run"] is \
+        processor.symbol_table["A.run"]
+    assert processor.unresolved == []
+
+
+def test_a_woken_node_is_visited_once_more(parseProgram):
+    program = parseProgram(SINGLE_LETTERS)
+    processor = CountingProcessor()
+    for node in program.statements:
+        processor.visitNode(node)
+    processor.registerSymbols(processor.global_scope)
+    # NOTE: wakes everything before the fixpoint starts, as an import that
+    # resolves during the first pass would.
+    processor.wakeNames(list(processor.waiting))
+    processor.resolveDeferred()
+    call, = [node for node in iterNodes(program)
+             if node.kind == "call_expression"]
+    assert processor.visits[call] == 2
+    assert dependencies(processor, "A.run") == ["B.hello"]
+    processor.scope = processor.symbol_table["A.run"].scope
+    processor.visitNode(call)
+    assert dependencies(processor, "A.run") == ["B.hello"]
+
+
+def test_outstanding_counts_only_unresolved_deferrals(parseProgram):
+    processor = process(parseProgram, SINGLE_LETTERS)
+    assert len(processor.defered_deps) == 1
+    assert processor.outstanding(processor.defered_deps) == 0
+    processor = process(parseProgram, CYCLE)
+    assert processor.outstanding(processor.defered_deps) == 1
+    assert processor.outstanding(processor.defered_imports) == 0
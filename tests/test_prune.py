@@ -0,0 +1,86 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from phase.inference import SymbolProcessor
+from phase.reachability import Reachability
+
+RAY_PY = os.path.join(os.path.dirname(__file__), '..', 'ray', 'ray.py')
+
+CHAIN = """
+module Lib {
+    import Runtime;
+    def func Void hello(){
+        print("hi");
+    }
+    def func Void unused(){
+        print("unused");
+    }
+}
+module Mid {
+    import Lib;
+}
+module User {
+    import Mid;
+    def func Void go(){
+        hello();
+    }
+}
+from Runtime import Int32;
+from Runtime import CStringPtr;
+def func Int32 main( Int32: argc, CStringPtr: args){
+    from User import go;
+    go();
+    return 0;
+}
+"""
+
+
+class BlindProcessor(SymbolProcessor):
+    # NOTE: a lookup that can never see hello, the way the chained import
+    # once went unresolved.
+
+    def lookupSymbol(self, scope, symbol_name):
+        if symbol_name == "hello":
+            return None
+        return super().lookupSymbol(scope, symbol_name)
+
+
+def reachability(parseProgram, processor_type):
+    program = parseProgram(CHAIN)
+    processor = processor_type()
+    processor.processTree(program)
+    result = Reachability(processor)
+    result.processTree(program)
+    return processor, result
+
+
+def test_chained_import_is_reached(parseProgram):
+    processor, result = reachability(parseProgram, SymbolProcessor)
+    assert processor.symbol_table["Lib.hello"] in result.reached
+    assert processor.symbol_table["Lib.unused"] not in result.reached
+
+
+def test_unresolved_names_are_roots(parseProgram):
+    processor, result = reachability(parseProgram, BlindProcessor)
+    assert "hello" in result.unresolved_names
+    assert processor.symbol_table["Lib.hello"] in result.reached
+    assert processor.symbol_table["Lib.unused"] not in result.reached
+
+
+@pytest.mark.skipif(shutil.which("g++") is None, reason="needs g++")
+def test_pruned_chained_imports_compile(tmp_path):
+    (tmp_path / "main.ray").write_text(CHAIN)
+    build_dir = tmp_path / "build"
+    subprocess.run([sys.executable, RAY_PY, "--prefix", str(tmp_path),
+                    "--build-dir", str(build_dir), "--prune"], check=True,
+                   stdout=subprocess.DEVNULL)
+    binary = tmp_path / "chain"
+    subprocess.run(["g++", "-std=c++17", str(build_dir / "output.cpp"),
+                    "-o", str(binary)], check=True)
+    result = subprocess.run([str(binary)], check=True, capture_output=True,
+                            text=True)
+    assert result.stdout == "hi"
@@ -0,0 +1,59 @@
+from symbol import Scope, ScopeIndex, Symbol
+
+
+def module(index, parent, name, *functions):
+    scope = Scope(None, scope_name=name, parent=parent)
+    parent.scopes[name] = scope
+    index.declare(parent, name, Symbol(None, scope, name, "module"))
+    for function in functions:
+        sub_scope = Scope(None, scope_type="function", scope_name=function,
+                          parent=scope)
+        scope.scopes[function] = sub_scope
+        index.declare(scope, function, Symbol(None, sub_scope, function,
+                                              "function"))
+    return scope
+
+
+def test_import_keeps_memos_outside_the_importer():
+    index = ScopeIndex()
+    root = Scope(None)
+    runtime = module(index, root, "Runtime", "print")
+    left = module(index, root, "Left", "run")
+    right = module(index, root, "Right", "run")
+    for scope in (left.scopes["run"], right.scopes["run"]):
+        assert index.lookup(scope, "print") is None
+    index.importScope(left, runtime)
+    assert right.scopes["run"].resolved["print"][1] is None
+    assert left.scopes["run"].resolved == {}
+    assert index.lookup(left.scopes["run"], "print") is \
+        runtime.symbols["print"]
+    assert index.lookup(right.scopes["run"], "print") is None
+
+
+def test_import_retires_memos_of_scopes_importing_the_importer():
+    index = ScopeIndex()
+    root = Scope(None)
+    runtime = module(index, root, "Runtime", "print")
+    base = module(index, root, "Base")
+    user = module(index, root, "User", "go")
+    index.importScope(user, base)
+    assert index.lookup(user.scopes["go"], "print") is None
+    index.importScope(base, runtime)
+    assert index.lookup(user.scopes["go"], "print") is \
+        runtime.symbols["print"]
+
+
+def test_import_closure_is_kept_until_the_chain_changes():
+    index = ScopeIndex()
+    root = Scope(None)
+    runtime = module(index, root, "Runtime", "print")
+    base = module(index, root, "Base")
+    user = module(index, root, "User")
+    index.importScope(user, base)
+    imported = index.importedScopes(user)
+    assert imported == [base]
+    assert index.importedScopes(user) is imported
+    index.importScope(base, runtime)
+    assert index.importedScopes(user) == [base, runtime]
+    index.importScope(runtime, user)
+    assert index.importedScopes(runtime) == [user, base]
@@ -0,0 +1,13 @@
+from timings import PhaseTimer
+
+
+def test_report_writes_to_the_current_stderr(capsys):
+    timer = PhaseTimer()
+    with timer.phase("parse"):
+        pass
+    timer.count("symbols", 3)
+    timer.report()
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "parse" in captured.err
+    assert "symbols" in captured.err
@@ -0,0 +1,22 @@
+import gc
+
+from tree_cache import frozenTrees
+
+
+def test_frozen_trees_are_unfrozen_afterwards():
+    with frozenTrees() as freezeTrees:
+        trees = [[index] for index in range(100)]
+        freezeTrees()
+        assert gc.get_freeze_count() >= len(trees)
+    assert gc.get_freeze_count() == 0
+
+
+def test_a_heap_frozen_elsewhere_is_left_alone():
+    gc.freeze()
+    try:
+        frozen = gc.get_freeze_count()
+        with frozenTrees() as freezeTrees:
+            freezeTrees()
+        assert gc.get_freeze_count() == frozen
+    finally:
+        gc.unfreeze()